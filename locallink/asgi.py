@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallink.settings')
 
 application = get_asgi_application()
+
+# Build the typeahead index now rather than on the first keystroke
+from services.suggest import warm_up  # noqa: E402
+
+warm_up()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'services.middleware.RequestProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +71,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'locallink.wsgi.application'
 
+# Serve home, service_list, category_services and service_detail with their
+# async versions (services/async_views.py). Only worth enabling under ASGI.
+ASYNC_VIEWS = False
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -121,3 +127,73 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Service search
+# 'auto' uses the SQLite FTS5 index when present, else an in-process inverted index
+
+SEARCH_BACKEND = 'auto'
+
+# Seconds before the in-process inverted index is rebuilt to pick up writes
+# made by other worker processes
+SEARCH_INDEX_TTL = 300
+
+# Same, for the typeahead prefix index behind /api/suggest/
+SUGGEST_INDEX_TTL = 300
+
+
+# Review submission
+# 'direct' saves reviews in the request; 'queued' appends them to a queue table
+# that `python manage.py process_review_queue --loop` applies in batches
+
+REVIEW_INGESTION = 'direct'
+
+
+# Materialized rankings (see services/rankings.py), kept current by
+# `python manage.py refresh_rankings --loop`
+# Listings kept per category in each ranking
+RANKING_SIZE = 100
+# Virtual reviews at the site-wide mean blended into each top-rated score
+RANKING_PRIOR_REVIEWS = 5
+# Trending counts the reviews received in this many days
+TRENDING_WINDOW_DAYS = 7
+
+
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Service cards and the home page context are cached here (see services/cache.py).
+# A file-based cache works too:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'locallink',
+    }
+}
+
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+
+# Request profiling (see services/middleware.py)
+# Samples requests and logs query counts, DB/view/template time and repeated queries
+
+REQUEST_PROFILER = {
+    # Never while running the test suite
+    'SAMPLE_RATE': 0.0 if sys.argv[1:2] == ['test'] else 0.1 if DEBUG else 0.01,
+    'RESPONSE_HEADER': DEBUG,
+    'SLOW_REQUEST_MS': 500,
+    'DUPLICATE_THRESHOLD': 3,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'services.profiler': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,92 @@
+"""
+Production profile for locallink.
+
+Select it with DJANGO_SETTINGS_MODULE=locallink.settings_production. It
+builds on settings.py and switches on persistent database connections,
+SQLite WAL mode and pragmas, the cached template loader, cache-backed
+sessions and a configurable shared cache. `python manage.py check --deploy`
+reports which of these are active.
+"""
+
+import os
+from copy import deepcopy
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, LOGGING, REQUEST_PROFILER, TEMPLATES
+
+# Copies, so the base settings module is left untouched
+DATABASES = deepcopy(DATABASES)
+TEMPLATES = deepcopy(TEMPLATES)
+LOGGING = deepcopy(LOGGING)
+
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+
+# Database: keep connections open between requests instead of reconnecting
+# every time, and check them before reuse
+
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Applied to every new SQLite connection (see services/db.py). WAL lets
+# readers run alongside the writer; synchronous=NORMAL is safe under WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+    'mmap_size': 134217728,
+}
+
+
+# Templates: parse each template once per process
+
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+
+# Cache shared by every worker process (card/home caches, stats, sessions).
+# Point DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION at e.g.
+# django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }
+}
+
+# Sessions are read from the cache and only fall back to the database on a miss
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# Set DJANGO_REVIEW_INGESTION=queued to keep rating updates off SQLite's single
+# writer during requests; reviews are then only published while
+# `manage.py process_review_queue --loop` runs (`check --database default`
+# warns when the queue backs up)
+REVIEW_INGESTION = os.environ.get('DJANGO_REVIEW_INGESTION', 'direct')
+
+
+REQUEST_PROFILER = {
+    **REQUEST_PROFILER,
+    'SAMPLE_RATE': 0.01,
+    'RESPONSE_HEADER': False,
+}
+
+# Log which of the optimizations above are active when the app starts
+PERFORMANCE_SELF_CHECK = True
+
+LOGGING['loggers']['services.startup'] = {'handlers': ['console'], 'level': 'INFO', 'propagate': False}
@@ -1,26 +1,95 @@
-from django.contrib import admin
-from .models import Category, ServiceListing, Review
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .cache import invalidate_home
+from .models import Category, Place, ServiceListing, Review
+from .pagination import EstimatedCountPaginator
+from .rankings import mark_stale as mark_rankings_stale
+from .search import search_services
+from .suggest import get_suggestion_index
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'description', 'created_at']
+    list_display = ['name', 'description', 'available_count', 'listing_count', 'created_at']
     search_fields = ['name', 'description']
     list_filter = ['created_at']
 
 
+@admin.register(Place)
+class PlaceAdmin(admin.ModelAdmin):
+    list_display = ['display_name', 'kind', 'latitude', 'longitude']
+    list_filter = ['kind']
+    search_fields = ['name', 'display_name']
+    readonly_fields = ['name']
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that may hold millions of rows"""
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
+
+
 @admin.register(ServiceListing)
-class ServiceListingAdmin(admin.ModelAdmin):
+class ServiceListingAdmin(LargeTableAdmin):
     list_display = ['service_name', 'provider_name', 'category', 'location_area', 'is_available', 'created_at']
-    list_filter = ['category', 'is_available', 'created_at']
+    list_select_related = ['category']
+    list_filter = ['is_available', 'category', 'created_at']
+    # Matched through the search index (see get_search_results), not LIKE scans
     search_fields = ['service_name', 'provider_name', 'location_area', 'description']
     list_editable = ['is_available']
     readonly_fields = ['created_at', 'updated_at']
+    actions = ['mark_available', 'mark_unavailable']
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            # Also match a listing id typed into the search box
+            matches = search_services(ServiceListing.objects.all(), search_term).values('pk')
+            return queryset.filter(Q(pk=int(search_term)) | Q(pk__in=matches)), False
+        return search_services(queryset, search_term), False
+    
+    def set_availability(self, request, queryset, is_available):
+        """Flip availability with one UPDATE, keeping the category counts in step"""
+        with transaction.atomic():
+            changing = queryset.exclude(is_available=is_available)
+            per_category = list(changing.values('category_id').annotate(n=Count('id')).order_by())
+            pks = list(changing.values_list('pk', flat=True))
+            updated = changing.update(is_available=is_available, updated_at=timezone.now())
+            step = 1 if is_available else -1
+            Category.adjust_counts({row['category_id']: (0, step * row['n']) for row in per_category})
+            mark_rankings_stale(row['category_id'] for row in per_category)
+        invalidate_home()
+        get_suggestion_index().reindex(pks)
+        self.message_user(request, f'{updated} listing(s) marked {"available" if is_available else "unavailable"}.',
+                          messages.SUCCESS)
+    
+    @admin.action(description='Mark selected listings as available')
+    def mark_available(self, request, queryset):
+        self.set_availability(request, queryset, True)
+    
+    @admin.action(description='Mark selected listings as unavailable')
+    def mark_unavailable(self, request, queryset):
+        self.set_availability(request, queryset, False)
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ['service_listing', 'reviewer_name', 'rating', 'created_at']
+    list_select_related = ['service_listing']
     list_filter = ['rating', 'created_at']
-    search_fields = ['reviewer_name', 'comment', 'service_listing__service_name']
+    search_fields = ['reviewer_name', 'comment']
+    search_help_text = 'Search by reviewer, comment, or listing name, provider or area'
+    raw_id_fields = ['service_listing']
     readonly_fields = ['created_at']
+    
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            # Listings are matched through the listing search index
+            listings = search_services(ServiceListing.objects.all(), search_term).values('pk')
+            results |= queryset.filter(service_listing__in=listings)
+        return results, may_have_duplicates
@@ -0,0 +1,298 @@
+"""Read-only JSON API for listings, with strong ETags and 304 responses.
+
+Listing responses are paginated by cursor whenever the results are in their
+default order, so polling clients never pay for a COUNT or an OFFSET scan.
+"""
+import hashlib
+import json
+import math
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Avg, Count, Min, Q
+from django.db.models.functions import Substr
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition, require_GET
+
+from .cache import category_generation, listing_version
+from .export import EXPORT_FORMATS, stream_export
+from .geo import cells_filter, cells_for_box, parse_point, zoom_precision
+from .models import ServiceListing
+from .pagination import KeysetPaginator, paginate, supports_keyset, base_querystring
+from .suggest import KINDS, MAX_SUGGEST_LIMIT, SUGGEST_LIMIT, get_suggestion_index
+from .views import filter_services
+
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+
+def serialize_service(service, detail=False):
+    """Compact dict for one listing; empty values are left out"""
+    data = {
+        'id': service.pk,
+        'name': service.service_name,
+        'provider': service.provider_name,
+        'category': service.category.name,
+        'category_id': service.category_id,
+        'location': service.location_area,
+        'lat': service.latitude,
+        'lng': service.longitude,
+        'rating': service.rating_average,
+        'reviews': service.rating_count,
+        'price': service.price_range,
+        'updated': service.updated_at.isoformat(),
+    }
+    distance = getattr(service, 'distance', None)
+    if distance is not None:
+        data['distance_km'] = distance
+    if detail:
+        data.update({
+            'description': service.description,
+            'contact': service.contact_info,
+            'email': service.email,
+            'phone': service.phone,
+            'available': service.is_available,
+            'created': service.created_at.isoformat(),
+        })
+    return {key: value for key, value in data.items() if value not in (None, '')}
+
+
+def json_response(payload, etag=None, status=200):
+    response = HttpResponse(
+        json.dumps(payload, separators=(',', ':'), ensure_ascii=False),
+        content_type='application/json',
+        status=status,
+    )
+    if etag:
+        response.headers['ETag'] = etag
+    return response
+
+
+def version_etag(versions):
+    """Strong ETag over listing version stamps"""
+    digest = hashlib.sha1('|'.join(versions).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        size = API_PAGE_SIZE
+    return max(1, min(size, API_MAX_PAGE_SIZE))
+
+
+def _list_params_error(request):
+    """Why the filter parameters of ``api_service_list`` are invalid, or None"""
+    params = request.GET
+    try:
+        if params.get('category'):
+            int(params['category'])
+        if params.get('radius') and not 0 <= float(params['radius']) < float('inf'):
+            return 'radius must be a non-negative number of kilometres'
+    except ValueError:
+        return 'category must be an integer and radius a number'
+    if (params.get('user_lat') or params.get('user_lng')) and parse_point(params.get('user_lat'), params.get('user_lng')) is None:
+        return 'user_lat and user_lng must be a latitude between -90 and 90 and a longitude between -180 and 180'
+    return None
+
+
+@require_GET
+def api_service_list(request):
+    """Listings filtered like service_list: search, category, location, nearest"""
+    error = _list_params_error(request)
+    if error:
+        return json_response({'error': error}, status=400)
+    services, nearest_sort = filter_services(request)
+    per_page = _page_size(request)
+    if supports_keyset(services) and 'page' not in request.GET:
+        page_obj = KeysetPaginator(services, per_page).page(request.GET.get('cursor'))
+    else:
+        page_obj = paginate(request, services, per_page)
+
+    results = list(page_obj)
+    querystring = base_querystring(request)
+    links = {}
+    if page_obj.has_next():
+        links['next'] = (f'cursor={page_obj.next_cursor}' if page_obj.next_cursor
+                         else f'page={page_obj.next_page_number()}')
+    if page_obj.has_previous():
+        links['prev'] = (f'cursor={page_obj.previous_cursor}' if page_obj.is_keyset
+                         else f'page={page_obj.previous_page_number()}')
+    links = {name: f'?{link}&{querystring}' if querystring else f'?{link}' for name, link in links.items()}
+
+    versions = [f'{service.pk}:{listing_version(service)}:{getattr(service, "distance", "")}' for service in results]
+    # Category names are served too; renaming one bumps the generation
+    etag = version_etag([f'categories:{category_generation()}'] + versions + sorted(links.values()))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    payload = {'results': [serialize_service(service) for service in results], **links}
+    if nearest_sort:
+        payload['sort'] = 'nearest'
+    return json_response(payload, etag)
+
+
+def _detail_etag(request, pk):
+    row = ServiceListing.objects.filter(pk=pk).values('updated_at', 'rating_count', 'rating_sum').first()
+    if row is None:
+        return None
+    return version_etag([f'categories:{category_generation()}',
+                         f'{pk}:{row["updated_at"].timestamp():.6f}:{row["rating_count"]}:{row["rating_sum"]}'])
+
+
+@require_GET
+@condition(etag_func=_detail_etag)
+def api_service_detail(request, pk):
+    """Full details for one listing; answers 304 from a single-row version lookup"""
+    try:
+        service = ServiceListing.objects.select_related('category').get(pk=pk)
+    except ServiceListing.DoesNotExist:
+        raise Http404('Service not found')
+    return json_response(serialize_service(service, detail=True))
+
+
+def serialize_review(review):
+    return {
+        'id': review.pk,
+        'name': review.reviewer_name,
+        'rating': review.rating,
+        'comment': review.comment,
+        'created': review.created_at.isoformat(),
+    }
+
+
+@require_GET
+def api_service_reviews(request, pk):
+    """One cursor page of a listing's reviews, newest first, with its stored aggregates"""
+    try:
+        service = ServiceListing.objects.only('pk', 'rating_average', 'rating_count').get(pk=pk)
+    except ServiceListing.DoesNotExist:
+        raise Http404('Service not found')
+    page_obj = KeysetPaginator(service.reviews.all(), _page_size(request)).page(request.GET.get('cursor'))
+    payload = {
+        'rating': service.rating_average,
+        'reviews': service.rating_count,
+        'results': [serialize_review(review) for review in page_obj],
+    }
+    if page_obj.has_next():
+        payload['next'] = f'?cursor={page_obj.next_cursor}'
+    if page_obj.has_previous():
+        payload['prev'] = f'?cursor={page_obj.previous_cursor}'
+    return json_response(payload)
+
+
+def suggestion_url(suggestion):
+    """Where picking a suggestion leads: the category page or a filtered listing"""
+    if suggestion['kind'] == 'category':
+        return reverse('category_services', args=[suggestion['id']])
+    param = 'location' if suggestion['kind'] == 'location' else 'search'
+    return f"{reverse('service_list')}?{urlencode({param: suggestion['label']})}"
+
+
+@require_GET
+def api_suggest(request):
+    """Typeahead suggestions for ``q`` from the in-memory prefix index.
+
+    ``kind`` narrows the results to a comma-separated subset of service,
+    provider, category and location; ``limit`` caps them (default 8).
+    """
+    kinds = tuple(kind for kind in request.GET.get('kind', '').split(',') if kind in KINDS) or KINDS
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SUGGEST_LIMIT)), MAX_SUGGEST_LIMIT))
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    suggestions = get_suggestion_index().suggest(request.GET.get('q', ''), limit, kinds)
+    results = [
+        {'kind': suggestion['kind'], 'label': suggestion['label'], 'url': suggestion_url(suggestion)}
+        for suggestion in suggestions
+    ]
+    return json_response({'q': request.GET.get('q', ''), 'results': results})
+
+
+def _parse_bbox(value):
+    """Parse Leaflet's ``west,south,east,north`` bbox string"""
+    west, south, east, north = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90):
+        raise ValueError('bad latitude range')
+    if not (math.isfinite(west) and math.isfinite(east)):
+        raise ValueError('bad longitude')
+    return west, south, east, north
+
+
+@require_GET
+def api_service_clusters(request):
+    """Marker clusters for a map viewport.
+
+    Expects ``bbox=west,south,east,north`` and ``zoom``. Listings are grouped
+    by their geohash prefix at a precision chosen for the zoom level, so the
+    stored geohash doubles as a precomputed cell key for every zoom. Each
+    cluster is ``[lat, lng, count, id]`` where ``id`` is only set for single
+    listings.
+    """
+    try:
+        west, south, east, north = _parse_bbox(request.GET['bbox'])
+        zoom = int(request.GET.get('zoom', 10))
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+    except (KeyError, ValueError):
+        return json_response({'error': 'bbox=west,south,east,north and an integer zoom are required; '
+                                       'category must be an integer'}, status=400)
+
+    precision = zoom_precision(zoom)
+    # A box crossing the antimeridian is split into two
+    boxes = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    box_filter = Q()
+    for box_west, box_east in boxes:
+        box_west, box_east = max(-180.0, box_west), min(180.0, box_east)
+        box_filter |= (
+            cells_filter(cells_for_box(south, north, box_west, box_east))
+            & Q(latitude__range=(south, north), longitude__range=(box_west, box_east))
+        )
+
+    services = ServiceListing.objects.filter(is_available=True).exclude(geohash='').filter(box_filter)
+    if category_id is not None:
+        services = services.filter(category_id=category_id)
+
+    rows = (
+        services.annotate(cell=Substr('geohash', 1, precision))
+        .values('cell')
+        .annotate(count=Count('id'), lat=Avg('latitude'), lng=Avg('longitude'), first_id=Min('id'))
+        .order_by()
+    )
+    clusters = [
+        [round(row['lat'], 5), round(row['lng'], 5), row['count'], row['first_id'] if row['count'] == 1 else None]
+        for row in rows
+    ]
+    return json_response({'zoom': zoom, 'precision': precision, 'clusters': clusters})
+
+
+@require_GET
+@staff_member_required
+def export_services(request):
+    """Stream the available listings with ratings as CSV (default) or NDJSON.
+
+    Staff only, since rows carry contact details. Accepts the same
+    ``category`` and ``location`` filters as the list page; the
+    ``export_services`` command can include unavailable listings.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return json_response({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}, status=400)
+
+    if not request.GET.get('category', '0').isdigit():
+        return json_response({'error': 'category must be an integer'}, status=400)
+
+    services = ServiceListing.objects.filter(is_available=True)
+    if request.GET.get('category'):
+        services = services.filter(category_id=request.GET['category'])
+    if request.GET.get('location'):
+        services = services.filter(location_area__icontains=request.GET['location'])
+
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(stream_export(services, export_format), content_type=f'{content_type}; charset=utf-8')
+    response.headers['Content-Disposition'] = f'attachment; filename="locallink-services.{export_format}"'
+    return response
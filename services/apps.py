@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ServicesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'services'
+
+    def ready(self):
+        from django.conf import settings
+        from . import checks, db, signals  # noqa: F401
+
+        if getattr(settings, 'PERFORMANCE_SELF_CHECK', False):
+            checks.log_optimization_status()
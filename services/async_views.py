@@ -0,0 +1,141 @@
+"""Async versions of the read-heavy views, for ASGI deployments.
+
+They mirror ``services.views`` but fetch through Django's async ORM API, so
+the event loop is free while a query runs. Queries are awaited one after
+another: the async ORM runs them through ``sync_to_async`` on a single
+thread, so gathering them would not overlap anything. Templates are
+rendered only after every row they use has been fetched, since the event
+loop cannot run lazy queries. Enabled with ``settings.ASYNC_VIEWS`` (see
+``services/urls.py``).
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.messages import get_messages
+from django.shortcuts import render, redirect, aget_object_or_404
+
+from .cache import aget_home_context
+from .forms import ReviewForm
+from .models import ServiceListing, Category
+from .ownership import is_service_owner
+from .pagination import KeysetPaginator, apaginate, base_querystring
+from .rankings import RANKED_SORTS, ranked_services
+from .review_queue import pending_reviews_for, submit_review
+from .search import search_services
+from .views import RADIUS_CHOICES_KM, REVIEWS_PER_PAGE, SITE_TOTALS, filter_services, stored_listing_count
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _render(request, template_name, context):
+    # Session-backed messages would otherwise be loaded lazily mid-render
+    await sync_to_async(len)(get_messages(request))
+    return render(request, template_name, context)
+
+
+async def home(request):
+    """Home page showing featured services and categories"""
+    async def build_context():
+        featured_services = await _alist(
+            ServiceListing.objects.filter(is_available=True).select_related('category').order_by('-created_at')[:6])
+        categories = await _alist(Category.objects.all()[:8])
+        totals = await Category.objects.aaggregate(**SITE_TOTALS)
+        return {
+            'featured_services': featured_services,
+            'categories': categories,
+            'totals': totals,
+        }
+    
+    context = await aget_home_context(build_context)
+    return await _render(request, 'services/home.html', context)
+
+
+async def service_list(request):
+    """List all services with search and filter functionality"""
+    # Building the filters can touch the database (in-process search index)
+    services, _ = await sync_to_async(filter_services)(request)
+    # Categories first: their stored counts can stand in for COUNT(*)
+    categories = await _alist(Category.objects.all())
+    page_obj = await apaginate(request, services, 12, count=stored_listing_count(request, categories))
+    fallback_services = []
+    if not len(page_obj):
+        fallback_services = await _alist(ServiceListing.objects.select_related('category')[:6])
+    
+    context = {
+        'page_obj': page_obj,
+        'querystring': base_querystring(request),
+        'categories': categories,
+        'search_query': request.GET.get('search', ''),
+        'selected_category': request.GET.get('category'),
+        'selected_location': request.GET.get('location'),
+        'fallback_services': fallback_services,
+        'user_lat': request.GET.get('user_lat', ''),
+        'user_lng': request.GET.get('user_lng', ''),
+        'radius_choices': RADIUS_CHOICES_KM,
+    }
+    return await _render(request, 'services/service_list.html', context)
+
+
+async def service_detail(request, pk):
+    """Detail view for a specific service"""
+    service = await aget_object_or_404(ServiceListing.objects.select_related('category'), pk=pk)
+    
+    # Handle review form submission
+    if request.method == 'POST':
+        form = ReviewForm(request.POST)
+        if form.is_valid():
+            await sync_to_async(submit_review)(request, service, form)
+            messages.success(request, 'Thank you for your review!')
+            return redirect('service_detail', pk=pk)
+    else:
+        form = ReviewForm()
+    
+    cursor = request.GET.get('cursor')
+    reviews = await KeysetPaginator(service.reviews.all(), REVIEWS_PER_PAGE).apage(cursor)
+    is_owner = await sync_to_async(is_service_owner)(request, service)
+    pending_reviews = await sync_to_async(pending_reviews_for)(request, service)
+    context = {
+        'service': service,
+        'reviews': reviews,
+        'pending_reviews': [] if cursor else pending_reviews,
+        'form': form,
+        'is_owner': is_owner,
+    }
+    return await _render(request, 'services/service_detail.html', context)
+
+
+async def service_reviews(request, pk):
+    """HTML fragment with the page of reviews after ``cursor``, for "Load more" """
+    service = await aget_object_or_404(ServiceListing.objects.only('pk'), pk=pk)
+    reviews = await KeysetPaginator(service.reviews.all(), REVIEWS_PER_PAGE).apage(request.GET.get('cursor'))
+    return render(request, 'services/review_page.html', {'service': service, 'reviews': reviews})
+
+
+async def category_services(request, category_id):
+    """Show services for a specific category"""
+    category = await aget_object_or_404(Category, pk=category_id)
+    services = ServiceListing.objects.filter(category=category, is_available=True).select_related('category')
+    
+    # Search within category
+    search_query = request.GET.get('search', '')
+    if search_query:
+        services = await sync_to_async(search_services)(
+            services, search_query, fields=('service_name', 'provider_name', 'description'))
+    
+    sort = request.GET.get('sort')
+    if sort in RANKED_SORTS:
+        # Checks for a computed ranking first
+        services = await sync_to_async(ranked_services)(services, sort, category.pk)
+    
+    stored_count = None if search_query or sort in RANKED_SORTS else category.available_count
+    page_obj = await apaginate(request, services, 12, count=stored_count)
+    
+    context = {
+        'category': category,
+        'page_obj': page_obj,
+        'querystring': base_querystring(request),
+        'search_query': search_query,
+        'sort': sort,
+    }
+    return await _render(request, 'services/category_services.html', context)
@@ -0,0 +1,165 @@
+"""Versioned caching of rendered service cards and the home page context.
+
+Card keys embed a per-listing version stamp (``updated_at`` plus the stored
+rating aggregates) and a category generation, so a changed listing simply
+misses and stale entries age out. A card's distance from the visitor is
+filled in after the cached HTML is read, so it is not part of the key. The home context key carries a version
+that the model signals in ``services.signals`` bump; the version lives in
+the cache backend, so with a shared cache every worker sees the bump.
+
+Hits and misses are tallied in-process and added to the counters in the
+cache with ``incr`` at the end of each request, so every worker contributes
+to the same numbers.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+FRAGMENT_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600)
+HOME_CONTEXT_KEY = 'services:home:context'
+HOME_VERSION_KEY = 'services:home:version'
+CATEGORY_GENERATION_KEY = 'services:category:generation'
+GAZETTEER_GENERATION_KEY = 'services:gazetteer:generation'
+STATS_KINDS = ('card', 'home')
+# Rendered in place of the distance in cached cards; user text is escaped,
+# so it can only come from the template
+DISTANCE_SLOT = mark_safe('<!--distance-->')
+
+
+def listing_version(service):
+    """Stamp that changes whenever anything shown on the card changes"""
+    return f'{service.updated_at.timestamp():.6f}:{service.rating_count}:{service.rating_sum}'
+
+
+def _generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        generation = 1
+        cache.add(key, generation, None)
+    return generation
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def category_generation():
+    return _generation(CATEGORY_GENERATION_KEY)
+
+
+def bump_category_generation():
+    """Invalidate every card at once, e.g. after a category is renamed"""
+    _bump(CATEGORY_GENERATION_KEY)
+
+
+def gazetteer_generation():
+    return _generation(GAZETTEER_GENERATION_KEY)
+
+
+def bump_gazetteer_generation():
+    """Make every worker's geocoding cache miss, e.g. after places are added"""
+    _bump(GAZETTEER_GENERATION_KEY)
+
+
+_pending_stats = Counter()
+_pending_lock = threading.Lock()
+
+
+def record(kind, hit):
+    """Tally a hit or miss; ``flush_stats`` adds the tallies to the cache"""
+    with _pending_lock:
+        _pending_stats[f'services:stats:{kind}:{"hits" if hit else "misses"}'] += 1
+
+
+def flush_stats(**kwargs):
+    """Add this process's tallies to the shared counters (connected to ``request_finished``)"""
+    if not _pending_stats:
+        return
+    with _pending_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+    for key, count in pending.items():
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def stats():
+    """Return {kind: {'hits': n, 'misses': n}} for every cached fragment kind"""
+    flush_stats()
+    keys = [f'services:stats:{kind}:{outcome}' for kind in STATS_KINDS for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    return {
+        kind: {outcome: values.get(f'services:stats:{kind}:{outcome}', 0) for outcome in ('hits', 'misses')}
+        for kind in STATS_KINDS
+    }
+
+
+def reset_stats():
+    with _pending_lock:
+        _pending_stats.clear()
+    cache.delete_many([f'services:stats:{kind}:{outcome}' for kind in STATS_KINDS for outcome in ('hits', 'misses')])
+
+
+def render_card(service, template_name, distance=None, generation=None):
+    """Render a service card, reusing the cached HTML for this listing version.
+
+    Pass ``generation`` (from ``category_generation()``) when rendering many
+    cards to read it once.
+    """
+    if generation is None:
+        generation = category_generation()
+    key = f'services:card:{template_name}:{service.pk}:{listing_version(service)}:{generation}'
+    if distance is not None:
+        key += ':distance'
+    html = cache.get(key)
+    record('card', html is not None)
+    if html is None:
+        slot = DISTANCE_SLOT if distance is not None else None
+        html = render_to_string(template_name, {'service': service, 'distance': slot})
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    if distance is not None:
+        html = html.replace(DISTANCE_SLOT, escape(distance))
+    return mark_safe(html)
+
+
+def get_home_context(build):
+    """Return the cached home page context, calling ``build()`` on a miss"""
+    key = f'{HOME_CONTEXT_KEY}:{_generation(HOME_VERSION_KEY)}'
+    context = cache.get(key)
+    record('home', context is not None)
+    if context is None:
+        context = build()
+        cache.set(key, context, FRAGMENT_TIMEOUT)
+    return context
+
+
+async def aget_home_context(build):
+    """Async ``get_home_context``; ``build`` is a coroutine function"""
+    version = await cache.aget(HOME_VERSION_KEY)
+    if version is None:
+        version = 1
+        await cache.aadd(HOME_VERSION_KEY, version, None)
+    key = f'{HOME_CONTEXT_KEY}:{version}'
+    context = await cache.aget(key)
+    record('home', context is not None)
+    if context is None:
+        context = await build()
+        await cache.aset(key, context, FRAGMENT_TIMEOUT)
+    return context
+
+
+def invalidate_home():
+    """Retire the cached home context in every worker sharing the cache"""
+    _bump(HOME_VERSION_KEY)
@@ -0,0 +1,92 @@
+"""Self-check for the production optimizations (see locallink/settings_production.py).
+
+``optimization_status()`` reports which ones are active. The deploy system
+check (``manage.py check --deploy``) warns about the inactive ones, and
+with ``PERFORMANCE_SELF_CHECK`` enabled the status is logged at startup.
+
+With queued review ingestion, the database check (``manage.py check
+--database default``) also warns when pending reviews are not being applied.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import checks
+from django.db import DatabaseError
+from django.utils import timezone
+
+
+logger = logging.getLogger('services.startup')
+
+SHARED_CACHE_EXCLUDED = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHE_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def _uses_cached_loader(template_settings):
+    loaders = template_settings.get('OPTIONS', {}).get('loaders')
+    if loaders is None:
+        # Django wraps the default loaders in the cached loader itself
+        return True
+    return any(
+        isinstance(loader, (list, tuple)) and loader[0] == 'django.template.loaders.cached.Loader'
+        for loader in loaders
+    )
+
+
+def optimization_status():
+    """{name: active} for each production optimization that applies here"""
+    database = settings.DATABASES['default']
+    django_templates = [t for t in settings.TEMPLATES if t['BACKEND'].endswith('DjangoTemplates')]
+    status = {
+        'persistent DB connections': bool(database.get('CONN_MAX_AGE')),
+        'cached template loader': all(_uses_cached_loader(t) for t in django_templates),
+        'cache-backed sessions': settings.SESSION_ENGINE in CACHE_SESSION_ENGINES,
+        'shared cache backend': settings.CACHES['default']['BACKEND'] not in SHARED_CACHE_EXCLUDED,
+    }
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+        status['SQLite WAL mode'] = str(pragmas.get('journal_mode', '')).lower() == 'wal'
+    return status
+
+
+@checks.register(checks.Tags.database, deploy=True)
+def check_optimizations(app_configs, **kwargs):
+    return [
+        checks.Warning(f'Production optimization inactive: {name}.',
+                       hint='See locallink/settings_production.py.', id='services.W001')
+        for name, active in optimization_status().items() if not active
+    ]
+
+
+@checks.register(checks.Tags.database)
+def check_review_queue(app_configs, databases=None, **kwargs):
+    """Warn when queued reviews wait longer than ``REVIEW_QUEUE_MAX_AGE`` seconds"""
+    from .models import PendingReview
+    from .review_queue import queued
+
+    if not queued() or not databases or 'default' not in databases:
+        return []
+    max_age = getattr(settings, 'REVIEW_QUEUE_MAX_AGE', 300)
+    try:
+        backlog = PendingReview.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=max_age)).count()
+    except DatabaseError:
+        return []
+    if not backlog:
+        return []
+    return [checks.Warning(
+        f'{backlog} queued review(s) have waited more than {max_age} seconds.',
+        hint='Run `python manage.py process_review_queue --loop` next to the web workers.',
+        id='services.W002',
+    )]
+
+
+def log_optimization_status():
+    status = optimization_status()
+    summary = ', '.join(f'{name}: {"on" if active else "off"}' for name, active in status.items())
+    logger.info('Performance self-check: %s', summary)
@@ -0,0 +1,23 @@
+"""Per-connection database setup"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+
+
+@receiver(connection_created, dispatch_uid='services.sqlite_pragmas')
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Run ``settings.SQLITE_PRAGMAS`` on every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not PRAGMA_NAME_RE.match(name) or not re.match(r'^-?\w+$', str(value)):
+                raise ValueError(f'Invalid SQLite pragma: {name}={value!r}')
+            cursor.execute(f'PRAGMA {name} = {value}')
+
@@ -0,0 +1,88 @@
+"""Streaming export of the service directory as CSV or NDJSON.
+
+Rows are read with ``.values_list().iterator(chunk_size=...)`` so neither
+the endpoint nor the management command holds more than one chunk in
+memory, however large the directory is.
+"""
+import csv
+import json
+
+
+EXPORT_FIELDS = [
+    ('id', 'pk'),
+    ('service_name', 'service_name'),
+    ('provider_name', 'provider_name'),
+    ('category', 'category__name'),
+    ('location_area', 'location_area'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('price_range', 'price_range'),
+    ('contact_info', 'contact_info'),
+    ('email', 'email'),
+    ('phone', 'phone'),
+    ('description', 'description'),
+    ('is_available', 'is_available'),
+    ('average_rating', 'rating_average'),
+    ('review_count', 'rating_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+EXPORT_FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 2000
+LINES_PER_CHUNK = 500
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Yield one dict per listing, keyed by export column name"""
+    names = [name for name, _ in EXPORT_FIELDS]
+    lookups = [lookup for _, lookup in EXPORT_FIELDS]
+    rows = queryset.order_by('pk').values_list(*lookups)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(names, row))
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _batched(lines, size=LINES_PER_CHUNK):
+    """Join lines into larger chunks so the server isn't flushing every row"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_csv(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    yield from _batched(
+        writer.writerow([_plain(value) for value in row.values()])
+        for row in export_rows(queryset, chunk_size)
+    )
+
+
+def stream_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    yield from _batched(
+        json.dumps({key: _plain(value) for key, value in row.items()},
+                   ensure_ascii=False, separators=(',', ':')) + '\n'
+        for row in export_rows(queryset, chunk_size)
+    )
+
+
+def stream_export(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """Generator of text chunks for ``export_format`` ('csv' or 'ndjson')"""
+    if export_format == 'csv':
+        return stream_csv(queryset, chunk_size)
+    return stream_ndjson(queryset, chunk_size)
@@ -78,3 +78,30 @@ class ReviewForm(forms.ModelForm):
                 'placeholder': 'Share your experience with this service...'
             }),
         }
+
+
+class ServiceImportForm(ServiceListingForm):
+    """ServiceListingForm rules for bulk imports, with categories given by name.
+
+    Category names are resolved against a dict loaded once per import, so
+    validating a row never queries the database.
+    """
+    category = forms.CharField(max_length=100)
+    
+    class Meta(ServiceListingForm.Meta):
+        # Left out of the model fields: the category is resolved from the
+        # cached lookup below, so the foreign key check (one query per row)
+        # is never run on it
+        fields = [field for field in ServiceListingForm.Meta.fields if field != 'category']
+    
+    def __init__(self, *args, categories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.categories = categories if categories is not None else {}
+    
+    def clean_category(self):
+        name = self.cleaned_data['category'].strip()
+        category = self.categories.get(name.lower())
+        if category is None:
+            raise forms.ValidationError(f'Unknown category "{name}".')
+        self.instance.category = category
+        return category
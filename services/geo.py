@@ -0,0 +1,332 @@
+"""Geographic helpers: distances, geohash cells and nearest-first lookups"""
+import heapq
+from array import array
+from math import radians, cos, sin, acos, ceil, floor
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ACos, Least, Round
+
+try:
+    import numpy
+except ImportError:  # optional: the array-based fallback gives the same results
+    numpy = None
+
+
+EARTH_RADIUS_KM = 6371
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Radius (km) of the first bounding box tried by a nearest search. Each
+# round that does not yield enough listings quadruples the radius.
+NEAREST_START_RADIUS_KM = 5
+NEAREST_MAX_RADIUS_KM = 20040
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a base32 geohash string"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def parse_point(lat, lng):
+    """``(lat, lng)`` as floats, or None unless both parse and are finite and in range"""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    # NaN and infinities fail the range checks
+    if -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+    return None
+
+
+def geohash_cell_size(precision):
+    """Return the (lat_degrees, lng_degrees) covered by one geohash cell"""
+    total_bits = 5 * precision
+    lng_bits = ceil(total_bits / 2)
+    lat_bits = total_bits - lng_bits
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle.
+
+    Longitudes are not wrapped, so callers crossing the antimeridian get
+    values outside [-180, 180].
+    """
+    dlat = radius_km / 111.0
+    min_lat = max(-90.0, lat - dlat)
+    max_lat = min(90.0, lat + dlat)
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 89.9:
+        return min_lat, max_lat, -180.0, 180.0
+    dlng = radius_km / (111.0 * cos(radians(widest)))
+    if dlng >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+
+def covering_cells(lat, lng, radius_km):
+    """Geohash prefixes that together cover the bounding box of a circle"""
+    return cells_for_box(*bounding_box(lat, lng, radius_km))
+
+
+def cells_for_box(min_lat, max_lat, min_lng, max_lng):
+    """Geohash prefixes that together cover a lat/lng box.
+
+    The precision is the finest one whose cells are at least as large as
+    the box, which keeps the result to a handful of prefixes.
+    """
+    precision = GEOHASH_PRECISION
+    while precision > 1:
+        cell_lat, cell_lng = geohash_cell_size(precision)
+        if cell_lat >= (max_lat - min_lat) and cell_lng >= (max_lng - min_lng):
+            break
+        precision -= 1
+    cell_lat, cell_lng = geohash_cell_size(precision)
+
+    cells = set()
+    lat_steps = int(floor((max_lat - min_lat) / cell_lat)) + 1
+    lng_steps = int(floor((max_lng - min_lng) / cell_lng)) + 1
+    for i in range(lat_steps + 1):
+        point_lat = min(max_lat, min_lat + i * cell_lat)
+        for j in range(lng_steps + 1):
+            point_lng = min(max_lng, min_lng + j * cell_lng)
+            wrapped_lng = (point_lng + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(point_lat, wrapped_lng, precision))
+    return sorted(cells)
+
+
+def zoom_precision(zoom):
+    """Geohash precision whose cells are roughly a quarter tile wide at a map zoom"""
+    return max(1, min(GEOHASH_PRECISION, (2 * (zoom + 2)) // 5))
+
+
+def cells_filter(cells):
+    """Build a Q object matching listings whose geohash falls in any cell.
+
+    Uses range comparisons rather than LIKE so the geohash index is used.
+    """
+    condition = Q()
+    for cell in cells:
+        condition |= Q(geohash__gte=cell, geohash__lt=cell + '~')
+    return condition
+
+
+def trig_columns(lat, lng):
+    """Precomputed sin/cos of a coordinate, as stored on ServiceListing"""
+    lat_r = radians(lat)
+    lng_r = radians(lng)
+    return {
+        'lat_sin': sin(lat_r),
+        'lat_cos': cos(lat_r),
+        'lng_sin': sin(lng_r),
+        'lng_cos': cos(lng_r),
+    }
+
+
+def _columns(rows, width):
+    """Transpose ``values_list`` rows into one float sequence per column"""
+    if numpy is not None:
+        return numpy.array(list(rows), dtype=float).reshape(-1, width).T
+    columns = [array('d') for _ in range(width)]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    return columns
+
+
+def batch_distances(lat, lng, lat_sin, lat_cos, lng_sin, lng_cos):
+    """Great-circle distances (km) from a point to many stored coordinates.
+
+    Takes the stored sin/cos columns (see ``trig_columns``), so each row
+    costs a few multiplications and one ``acos``. Vectorized with NumPy
+    when it is installed, otherwise a single pass over ``array('d')``.
+    """
+    origin = trig_columns(lat, lng)
+    a = origin['lat_sin']
+    b = origin['lat_cos'] * origin['lng_cos']
+    c = origin['lat_cos'] * origin['lng_sin']
+    if numpy is not None:
+        dot = a * numpy.asarray(lat_sin) + numpy.asarray(lat_cos) * (
+            b * numpy.asarray(lng_cos) + c * numpy.asarray(lng_sin))
+        return EARTH_RADIUS_KM * numpy.arccos(numpy.clip(dot, -1.0, 1.0))
+    return array('d', (
+        EARTH_RADIUS_KM * acos(max(-1.0, min(1.0, a * ls + lc * (b * gc + c * gs))))
+        for ls, lc, gs, gc in zip(lat_sin, lat_cos, lng_sin, lng_cos)
+    ))
+
+
+def top_k(distances, keys, k, max_distance=None):
+    """The ``k`` smallest ``(distance, key)`` pairs, ties broken by key.
+
+    Only the selected pairs are sorted (``numpy.argpartition`` or
+    ``heapq.nsmallest``), so picking a page from a large candidate set
+    does not sort every candidate. Pairs beyond ``max_distance`` are dropped.
+    """
+    if k <= 0:
+        return []
+    if numpy is not None:
+        distances = numpy.asarray(distances, dtype=float)
+        keys = numpy.asarray(keys)
+        index = numpy.arange(len(distances)) if max_distance is None else numpy.flatnonzero(distances <= max_distance)
+        if len(index) > k:
+            # Keep every candidate tied with the k-th distance so the
+            # key tie-break below is exact
+            kth = numpy.partition(distances[index], k - 1)[k - 1]
+            index = index[distances[index] <= kth]
+        order = numpy.lexsort((keys[index], distances[index]))[:k]
+        return [(float(distances[i]), keys[i].item()) for i in index[order]]
+    pairs = zip(distances, keys)
+    if max_distance is not None:
+        pairs = (pair for pair in pairs if pair[0] <= max_distance)
+    return heapq.nsmallest(k, pairs)
+
+
+def within_radius(queryset, lat, lng, radius_km):
+    """Listings within ``radius_km`` of a point, annotated with ``distance``.
+
+    A geohash-cell and lat/lng bounding box narrows the candidates, then the
+    great-circle condition is checked in SQL as a dot product of unit
+    vectors built from the stored sin/cos columns:
+
+        cos(d / R) = sin(lat1) sin(lat2) + cos(lat1) cos(lat2) cos(lng1 - lng2)
+
+    so no row is iterated in Python.
+    """
+    radius_km = min(radius_km, NEAREST_MAX_RADIUS_KM)
+    origin = trig_columns(lat, lng)
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    candidates = queryset.exclude(geohash='').filter(
+        cells_filter(covering_cells(lat, lng, radius_km)),
+        latitude__range=(min_lat, max_lat),
+    )
+    if min_lng >= -180 and max_lng <= 180:
+        candidates = candidates.filter(longitude__range=(min_lng, max_lng))
+
+    dot = (
+        F('lat_sin') * Value(origin['lat_sin'])
+        + F('lat_cos') * F('lng_cos') * Value(origin['lat_cos'] * origin['lng_cos'])
+        + F('lat_cos') * F('lng_sin') * Value(origin['lat_cos'] * origin['lng_sin'])
+    )
+    # Clamp for float error before ACOS; the alias keeps the filter and the
+    # distance on one expression
+    candidates = candidates.alias(proximity=Least(dot, Value(1.0), output_field=FloatField()))
+    return candidates.filter(proximity__gte=cos(radius_km / EARTH_RADIUS_KM)).annotate(
+        distance=Round(ACos(F('proximity')) * Value(float(EARTH_RADIUS_KM)), 2, output_field=FloatField()),
+    )
+
+
+def nearest(queryset, lat, lng, limit):
+    """Return up to ``limit`` located listings ordered by distance.
+
+    Candidates are fetched from a growing bounding box of geohash cells;
+    their distances are computed in one batch and only the top ``limit``
+    are sorted. Each returned instance gets a ``distance`` attribute in KM.
+    """
+    if limit <= 0:
+        return []
+    located = queryset.exclude(geohash='')
+    radius = NEAREST_START_RADIUS_KM
+    while True:
+        rows = located.filter(cells_filter(covering_cells(lat, lng, radius)))
+        pks, *trig = _columns(rows.values_list('pk', 'lat_sin', 'lat_cos', 'lng_sin', 'lng_cos'), 5)
+        distances = batch_distances(lat, lng, *trig)
+        if radius >= NEAREST_MAX_RADIUS_KM:
+            top = top_k(distances, pks, limit)
+            break
+        # Only rows inside the radius are guaranteed to be in true order;
+        # anything further out may be beaten by a row outside the box.
+        top = top_k(distances, pks, limit, max_distance=radius)
+        if len(top) >= limit:
+            break
+        radius *= 4
+
+    top = [(distance, int(pk)) for distance, pk in top]
+    objects = queryset.in_bulk([pk for _, pk in top])
+    results = []
+    for distance, pk in top:
+        service = objects[pk]
+        service.distance = round(distance, 2)
+        results.append(service)
+    return results
+
+
+class NearestResults:
+    """Lazy, sliceable nearest-first view of a ServiceListing queryset.
+
+    Designed to be handed to ``Paginator``: ``count()`` is a plain SQL count
+    and slicing only ranks as many listings as the requested page needs.
+    Listings without coordinates follow the located ones, newest first.
+    """
+
+    def __init__(self, queryset, lat, lng):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.lat = lat
+        self.lng = lng
+        self._count = None
+        self._located_count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def located_count(self):
+        if self._located_count is None:
+            self._located_count = self.queryset.exclude(geohash='').count()
+        return self._located_count
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            items = self[key:key + 1]
+            if not items:
+                raise IndexError(key)
+            return items[0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if stop <= start:
+            return []
+
+        located = self.located_count()
+        results = []
+        if start < located:
+            results = nearest(self.queryset, self.lat, self.lng, min(stop, located))[start:]
+        if stop > located:
+            unlocated = self.queryset.filter(geohash='')
+            for service in unlocated[max(0, start - located):stop - located]:
+                service.distance = None
+                results.append(service)
+        return results
@@ -0,0 +1,88 @@
+"""Offline geocoding of ``location_area`` strings.
+
+Place names live in the ``Place`` gazetteer table, seeded from the bundled
+``services/data/gazetteer.csv`` and extended with ``manage.py gazetteer``.
+``geocode()`` normalizes the text, looks up every run of up to
+``MAX_NAME_WORDS`` words in one query and keeps the best match: the longest
+name, then localities before cities, then the leftmost. Results are kept in
+a per-process LRU cache keyed by the normalized text and a gazetteer
+generation held in the shared cache; ``clear_cache()`` bumps the generation,
+so after a gazetteer change every worker misses, not just the one writing.
+"""
+import csv
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+from .cache import bump_gazetteer_generation, gazetteer_generation
+
+
+BUNDLED_GAZETTEER = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+MAX_NAME_WORDS = 4
+CACHE_SIZE = 4096
+KIND_PRIORITY = {'locality': 0, 'city': 1}
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase ASCII words separated by single spaces"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def read_gazetteer(path=BUNDLED_GAZETTEER):
+    """Yield ``(name, kind, latitude, longitude)`` rows from a gazetteer CSV"""
+    with open(path, encoding='utf-8', newline='') as handle:
+        for row in csv.DictReader(handle):
+            yield row['name'].strip(), row.get('kind') or 'locality', float(row['latitude']), float(row['longitude'])
+
+
+def candidate_names(normalized):
+    """Every run of up to MAX_NAME_WORDS words, as ``(name, length, position)``"""
+    words = normalized.split()
+    return [
+        (' '.join(words[start:start + length]), length, start)
+        for length in range(min(MAX_NAME_WORDS, len(words)), 0, -1)
+        for start in range(len(words) - length + 1)
+    ]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _geocode_normalized(normalized, generation):
+    from .models import Place
+
+    candidates = candidate_names(normalized)
+    if not candidates:
+        return None
+    places = {
+        place.name: place
+        for place in Place.objects.filter(name__in={name for name, _, _ in candidates}).only(
+            'name', 'kind', 'latitude', 'longitude')
+    }
+    matches = [
+        (-length, KIND_PRIORITY.get(places[name].kind, len(KIND_PRIORITY)), start, name)
+        for name, length, start in candidates if name in places
+    ]
+    if not matches:
+        return None
+    best = places[min(matches)[-1]]
+    return best.latitude, best.longitude
+
+
+def geocode(text, generation=None):
+    """``(latitude, longitude)`` for a free-text area, or None if no place matches.
+
+    Pass ``generation`` (from ``gazetteer_generation()``) when geocoding many
+    areas in a row, to read it from the cache once.
+    """
+    if generation is None:
+        generation = gazetteer_generation()
+    return _geocode_normalized(normalize(text), generation)
+
+
+def clear_cache():
+    """Drop cached lookups here and, through the shared generation, in every worker"""
+    bump_gazetteer_generation()
+    _geocode_normalized.cache_clear()
@@ -0,0 +1,154 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from io import StringIO
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+
+from services.models import Category, ServiceListing
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the services views against a freshly seeded test database and '
+            'write a JSON report (latency percentiles, query counts, peak memory)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--services', type=int, default=2000, help='Listings to seed')
+        parser.add_argument('--reviews-per-service', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per view')
+        parser.add_argument('--cache', choices=['warm', 'cold'], default='warm',
+                            help='cold clears the cache before every request')
+        parser.add_argument('--output', default='bench_output.json', help='Where to write the report')
+        parser.add_argument('--compare', help='Previous report to compare against')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Allowed p50 latency growth in percent before flagging a regression')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f'Seeding {options["services"]} services...')
+            call_command('populate_data', services=options['services'],
+                         reviews_per_service=options['reviews_per_service'],
+                         seed=options['seed'], stdout=StringIO())
+            report = {
+                'meta': {
+                    'services': ServiceListing.objects.count(),
+                    'seed': options['seed'],
+                    'iterations': options['iterations'],
+                    'cache': options['cache'],
+                    'database': connection.vendor,
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                },
+                'views': self.run_scenarios(options),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        for name, result in report['views'].items():
+            self.stdout.write(
+                f'{name:<22} p50 {result["p50_ms"]:>8.2f} ms  p90 {result["p90_ms"]:>8.2f} ms  '
+                f'p99 {result["p99_ms"]:>8.2f} ms  {result["queries"]:>3} queries  {result["peak_kb"]:>8.1f} KiB'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+
+        if options['compare']:
+            self.compare(report, options['compare'], options['threshold'])
+
+    def scenarios(self):
+        category = Category.objects.order_by('pk').first()
+        service = ServiceListing.objects.order_by('-rating_count', 'pk').first()
+        service_list = reverse('service_list')
+        return {
+            'home': reverse('home'),
+            'service_list': service_list,
+            'service_list_deep': f'{service_list}?page=5',
+            'service_list_search': f'{service_list}?search=tutoring',
+            'service_list_category': f'{service_list}?category={category.pk}',
+            'service_list_location': f'{service_list}?location=Mumbai',
+            'service_list_nearest': f'{service_list}?sort=nearest&user_lat=19.07&user_lng=72.87&page=3',
+            'service_list_radius': f'{service_list}?sort=nearest&radius=5&user_lat=19.07&user_lng=72.87',
+            'service_list_top_rated': f'{service_list}?sort=top_rated',
+            'category_services': reverse('category_services', args=[category.pk]),
+            'category_services_trending': f"{reverse('category_services', args=[category.pk])}?sort=trending",
+            'service_detail': reverse('service_detail', args=[service.pk]),
+        }
+
+    # Keep the request profiler out of the measurements
+    @override_settings(REQUEST_PROFILER={'SAMPLE_RATE': 0.0})
+    def run_scenarios(self, options):
+        client = Client()
+        results = {}
+        for name, url in self.scenarios().items():
+            response = client.get(url)  # warm-up, and a sanity check
+            if response.status_code != 200:
+                raise CommandError(f'{name}: GET {url} returned {response.status_code}')
+
+            timings = []
+            for _ in range(options['iterations']):
+                if options['cache'] == 'cold':
+                    cache.clear()
+                start = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            if options['cache'] == 'cold':
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                tracemalloc.start()
+                client.get(url)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            results[name] = {
+                'url': url,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p90_ms': round(percentile(timings, 90), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'mean_ms': round(statistics.fmean(timings), 3),
+                'queries': len(queries),
+                'peak_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as fh:
+            baseline = json.load(fh)['views']
+        regressions = []
+        for name, result in report['views'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            growth = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line = (f'{name:<22} p50 {before["p50_ms"]:.2f} -> {result["p50_ms"]:.2f} ms ({growth:+.1f}%), '
+                    f'queries {before["queries"]} -> {result["queries"]}')
+            if growth > threshold or result['queries'] > before['queries']:
+                regressions.append(line)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'{len(regressions)} view(s) regressed against {baseline_path}')
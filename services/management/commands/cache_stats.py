@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from services.cache import stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the service card and home page caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        for kind, counts in stats().items():
+            total = counts['hits'] + counts['misses']
+            ratio = f'{counts["hits"] / total:.1%}' if total else 'n/a'
+            self.stdout.write(f'{kind}: {counts["hits"]} hits, {counts["misses"]} misses (hit rate {ratio})')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,100 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test import RequestFactory
+
+from services.models import Category, ServiceListing, Review
+from services.pagination import KEYSET_ORDERING
+from services.rankings import RankedResults
+from services.views import filter_services
+
+
+# Plan lines that mean a table is read in full or results are sorted afterwards
+FULL_SCAN_PATTERNS = [
+    re.compile(r'^SCAN (?!.*(USING|VIRTUAL TABLE))(\S+)'),  # SQLite
+    re.compile(r'Seq Scan on (\S+)'),  # PostgreSQL
+]
+SORT_PATTERNS = [
+    re.compile(r'USE TEMP B-TREE FOR ORDER BY'),  # SQLite
+]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the querysets behind the listing views and flag full scans and unindexed sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan in full')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit non-zero if an indexed access path falls back to a full scan')
+
+    def listing_queryset(self, **params):
+        request = RequestFactory().get('/services/', params)
+        services, _ = filter_services(request)
+        return services.order_by(*KEYSET_ORDERING) if not services.query.order_by else services
+
+    def ranked_scenarios(self, name, **params):
+        """The two parts of a computed ranking's first page, or the live query before the first refresh"""
+        services, _ = filter_services(RequestFactory().get('/services/', params))
+        if isinstance(services, RankedResults):
+            return [(name, services.ranked[:12], True), (f'{name}, unranked rest', services.unranked[:12], True)]
+        # Aggregated per request until refresh_rankings has run
+        return [(f'{name} (not refreshed yet)', services[:12], False)]
+
+    def scenarios(self):
+        """(name, queryset, expect_index) for each access path the views use"""
+        category = Category.objects.order_by('pk').first()
+        service = ServiceListing.objects.order_by('pk').first()
+        category_id = category.pk if category else 0
+        pivot = ServiceListing.objects.filter(is_available=True).order_by(*KEYSET_ORDERING).first()
+        keyset = Q()
+        if pivot:
+            keyset = Q(created_at__lte=pivot.created_at) & ~Q(created_at=pivot.created_at, id__gte=pivot.pk)
+
+        available = ServiceListing.objects.filter(is_available=True)
+        return [
+            ('home featured', available.order_by('-created_at')[:6], True),
+            ('service_list page', self.listing_queryset()[:12], True),
+            ('service_list cursor page', self.listing_queryset().filter(keyset)[:13], True),
+            ('service_list category', self.listing_queryset(category=category_id)[:12], True),
+            ('category_services page', available.filter(category_id=category_id).order_by(*KEYSET_ORDERING)[:12], True),
+            ('service_list count', available.values('pk'), True),
+            ('service_detail reviews', Review.objects.filter(
+                service_listing_id=service.pk if service else 0).order_by('-created_at', '-id')[:10], True),
+            # Relevance and distance ranking sort the matches, and substring matching
+            # cannot use a B-tree index; these are reported for visibility only
+            ('service_list search', self.listing_queryset(search='tutoring')[:12], False),
+            ('service_list location', self.listing_queryset(location='Mumbai')[:12], False),
+            *self.ranked_scenarios('service_list top rated', sort='top_rated'),
+            *self.ranked_scenarios('category_services trending', sort='trending', category=category_id),
+            ('service_list radius', self.listing_queryset(
+                radius=5, sort='nearest', user_lat=19.07, user_lng=72.87)[:12], False),
+        ]
+
+    def handle(self, *args, **options):
+        problems = []
+        for name, queryset, expect_index in self.scenarios():
+            plan = queryset.explain()
+            scans = [match.group(match.lastindex) for pattern in FULL_SCAN_PATTERNS
+                     for line in plan.splitlines() for match in [pattern.search(line.strip(' |-`'))] if match]
+            sorts = any(pattern.search(plan) for pattern in SORT_PATTERNS)
+
+            flags = []
+            if scans:
+                flags.append(f'full scan of {", ".join(sorted(set(scans)))}')
+            if sorts:
+                flags.append('sort without index')
+            if flags and expect_index:
+                problems.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: {"; ".join(flags)}'))
+            elif flags:
+                self.stdout.write(self.style.WARNING(f'{name}: {"; ".join(flags)} (expected)'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: indexed'))
+            if options['verbose_plans'] or (flags and expect_index):
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        self.stdout.write(f'Checked on {connection.vendor}: {len(problems)} access path(s) not covered by an index.')
+        if problems and options['fail_on_scan']:
+            raise CommandError(f'Unindexed access paths: {", ".join(problems)}')
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from services.export import CHUNK_SIZE, EXPORT_FORMATS, stream_export
+from services.models import ServiceListing
+
+
+class Command(BaseCommand):
+    help = 'Stream every service listing with its category and ratings as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per database round trip')
+        parser.add_argument('--available-only', action='store_true', help='Skip unavailable listings')
+
+    def handle(self, *args, **options):
+        services = ServiceListing.objects.all()
+        if options['available_only']:
+            services = services.filter(is_available=True)
+
+        out = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in stream_export(services, options['format'], options['chunk_size']):
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f'Exported to {options["output"]}'))
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from services.cache import gazetteer_generation, invalidate_home
+from services.geocoding import BUNDLED_GAZETTEER, clear_cache, geocode, normalize, read_gazetteer
+from services.models import Place, ServiceListing
+
+
+class Command(BaseCommand):
+    help = 'Manage the offline gazetteer and geocode listings that have no coordinates'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+
+        load = subcommands.add_parser('load', help='Add or update places from a CSV (name,kind,latitude,longitude)')
+        load.add_argument('path', nargs='?', default=str(BUNDLED_GAZETTEER), help='Defaults to the bundled gazetteer')
+
+        add = subcommands.add_parser('add', help='Add or update one place')
+        add.add_argument('name')
+        add.add_argument('latitude', type=float)
+        add.add_argument('longitude', type=float)
+        add.add_argument('--kind', choices=[kind for kind, _ in Place.KIND_CHOICES], default='locality')
+
+        lookup = subcommands.add_parser('lookup', help='Show what a location_area string geocodes to')
+        lookup.add_argument('text')
+
+        backfill = subcommands.add_parser('backfill', help='Fill in coordinates for listings that have none')
+        backfill.add_argument('--batch-size', type=int, default=1000)
+        backfill.add_argument('--dry-run', action='store_true', help='Count matches without saving')
+
+    def handle(self, *args, **options):
+        getattr(self, f'handle_{options["action"]}')(options)
+
+    def handle_load(self, options):
+        try:
+            places = [
+                Place(name=normalize(name), display_name=name, kind=kind, latitude=latitude, longitude=longitude)
+                for name, kind, latitude, longitude in read_gazetteer(options['path'])
+            ]
+        except (OSError, KeyError, ValueError) as exc:
+            raise CommandError(f'Cannot read {options["path"]}: {exc}')
+        Place.objects.bulk_create(
+            places, update_conflicts=True, unique_fields=['name'],
+            update_fields=['display_name', 'kind', 'latitude', 'longitude'],
+        )
+        clear_cache()
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(places)} place(s); the gazetteer now has {Place.objects.count()}.'))
+
+    def handle_add(self, options):
+        if not normalize(options['name']):
+            raise CommandError('The place name must contain letters or digits')
+        place, created = Place.objects.update_or_create(
+            name=normalize(options['name']),
+            defaults={'display_name': options['name'], 'kind': options['kind'],
+                      'latitude': options['latitude'], 'longitude': options['longitude']},
+        )
+        self.stdout.write(self.style.SUCCESS(f'{"Added" if created else "Updated"} {place.display_name}.'))
+
+    def handle_lookup(self, options):
+        point = geocode(options['text'])
+        if point is None:
+            raise CommandError(f'No gazetteer match for "{options["text"]}"')
+        self.stdout.write(f'{point[0]}, {point[1]}')
+
+    def handle_backfill(self, options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be >= 1')
+        # bulk_update skips auto_now, so updated_at is set here; it feeds the
+        # listing version behind card caches and API ETags
+        fields = ['latitude', 'longitude', 'geocoded', 'updated_at', *ServiceListing.LOCATION_FIELDS]
+        missing = ServiceListing.objects.filter(latitude__isnull=True).order_by('pk').only('pk', 'location_area')
+        last_pk = 0
+        filled = unmatched = 0
+        while True:
+            batch = list(missing.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            located = []
+            now = timezone.now()
+            generation = gazetteer_generation()
+            for service in batch:
+                point = geocode(service.location_area, generation)
+                if point is None:
+                    unmatched += 1
+                    continue
+                service.latitude, service.longitude = point
+                service.geocoded = True
+                service.updated_at = now
+                service.update_location_fields()
+                located.append(service)
+            if located and not options['dry_run']:
+                ServiceListing.objects.bulk_update(located, fields)
+            filled += len(located)
+            self.stdout.write(f'{filled} geocoded, {unmatched} without a match so far...')
+
+        if filled and not options['dry_run']:
+            invalidate_home()
+        verb = 'Would geocode' if options['dry_run'] else 'Geocoded'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {filled} listing(s); {unmatched} had no gazetteer match.'))
@@ -0,0 +1,129 @@
+import csv
+import json
+import sys
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from services.cache import invalidate_home
+from services.forms import ServiceImportForm
+from services.models import Category, ServiceListing
+from services.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = ('Bulk-import service listings from CSV or NDJSON, validating rows with the '
+            'ServiceListingForm rules and inserting them in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV/NDJSON file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and inserted per batch')
+        parser.add_argument('--errors', help='Write rejected rows with their errors to this NDJSON file')
+        parser.add_argument('--create-categories', action='store_true', help='Create categories that do not exist yet')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, insert nothing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be >= 1')
+        export_format = options['format'] or self.guess_format(options['path'])
+        self.categories = {category.name.lower(): category for category in Category.objects.all()}
+        self.create_categories = options['create_categories']
+
+        source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8', newline='')
+        errors_file = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else None
+        imported = rejected = 0
+        created_pks = []
+        try:
+            rows = self.read_rows(source, export_format)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                listings, failures = self.validate_batch(batch)
+                for line_number, row, errors in failures:
+                    rejected += 1
+                    self.report_error(line_number, row, errors, errors_file)
+                if listings and not options['dry_run']:
+                    with transaction.atomic():
+                        ServiceListing.objects.bulk_create(listings)
+                    created_pks.extend(listing.pk for listing in listings)
+                imported += len(listings)
+                self.stdout.write(f'{imported} valid, {rejected} rejected so far...')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if errors_file:
+                errors_file.close()
+
+        if imported and not options['dry_run']:
+            # bulk_create skips the signals that maintain these
+            get_search_backend().reindex(created_pks)
+            Category.refresh_listing_counts()
+            invalidate_home()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {imported} listing(s); rejected {rejected}.'))
+
+    def guess_format(self, path):
+        if path.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+        if path.endswith('.csv'):
+            return 'csv'
+        raise CommandError('Cannot guess the input format; pass --format csv or --format ndjson')
+
+    def read_rows(self, source, export_format):
+        """Yield (line_number, row_dict) without loading the whole file"""
+        if export_format == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, {'__error__': f'Invalid JSON: {exc.msg}'}
+                continue
+            if not isinstance(row, dict):
+                row = {'__error__': 'Each line must be a JSON object'}
+            yield line_number, row
+
+    def resolve_category(self, name):
+        """Create missing categories on demand when --create-categories is set"""
+        name = (name or '').strip()
+        if name and self.create_categories and name.lower() not in self.categories:
+            category, _ = Category.objects.get_or_create(name=name)
+            self.categories[name.lower()] = category
+
+    def validate_batch(self, batch):
+        listings = []
+        failures = []
+        for line_number, row in batch:
+            if '__error__' in row:
+                failures.append((line_number, row, {'__all__': [row.pop('__error__')]}))
+                continue
+            data = {key: '' if value is None else str(value) for key, value in row.items()}
+            self.resolve_category(data.get('category'))
+            form = ServiceImportForm(data, categories=self.categories)
+            if not form.is_valid():
+                failures.append((line_number, row, form.errors.get_json_data()))
+                continue
+            listing = form.save(commit=False)
+            listing.fill_coordinates()
+            listing.update_location_fields()
+            listings.append(listing)
+        return listings, failures
+
+    def report_error(self, line_number, row, errors, errors_file):
+        if errors_file:
+            errors_file.write(json.dumps({'line': line_number, 'row': row, 'errors': errors}, ensure_ascii=False) + '\n')
+            return
+        messages = '; '.join(
+            f'{field}: {" ".join(error["message"] if isinstance(error, dict) else error for error in field_errors)}'
+            for field, field_errors in errors.items()
+        )
+        self.stderr.write(f'Line {line_number}: {messages}')
@@ -1,12 +1,36 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from services.cache import invalidate_home
 from services.models import Category, ServiceListing, Review
+from services.rankings import refresh_rankings
+from services.search import get_search_backend
 import random
 
 
+SERVICE_ADJECTIVES = [
+    "Reliable", "Express", "Friendly", "Expert", "Budget", "Premium", "Neighbourhood",
+    "Campus", "Doorstep", "Trusted", "Quick", "Affordable",
+]
+AREA_SUFFIXES = ["Central", "East", "West", "North", "South", "Old Town", "New Town", "Station Road"]
+
+
 class Command(BaseCommand):
-    help = 'Populate the database with sample data'
+    help = 'Populate the database with sample data, or bulk-generate a large synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--services', type=int, default=0,
+                            help='Bulk-generate this many extra listings (default: only the sample data)')
+        parser.add_argument('--reviews-per-service', type=int, default=3,
+                            help='Average reviews per generated listing (actual count varies 0..2x)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--unlocated-ratio', type=float, default=0.05,
+                            help='Share of generated listings without coordinates')
 
     def handle(self, *args, **options):
+        if options['services'] < 0 or options['reviews_per_service'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--services and --reviews-per-service must be >= 0 and --batch-size >= 1')
+        self.rng = random.Random(options['seed'])
         self.stdout.write('Creating sample data...')
 
         indian_service_locations = [
@@ -112,7 +136,7 @@ class Command(BaseCommand):
                 reviews_data.append({
                     'service_listing': service,
                     'reviewer_name': indian_reviewer_names[(idx+rev)%len(indian_reviewer_names)],
-                    'rating': random.randint(4,5),
+                    'rating': self.rng.randint(4,5),
                     'comment': indian_comments[(idx+rev)%len(indian_comments)]
                 })
 
@@ -123,6 +147,88 @@ class Command(BaseCommand):
                 defaults=review_data
             )
 
+        if options['services']:
+            self.generate_bulk(
+                indian_service_locations, indian_names, indian_phones, list(categories.values()),
+                indian_reviewer_names, indian_comments, options,
+            )
+
+        # So the top-rated and trending sorts have rankings to show
+        refresh_rankings(full=True)
+
         self.stdout.write(
             self.style.SUCCESS('Successfully populated database with sample data!')
         )
+
+    def generate_bulk(self, locations, names, phones, categories, reviewer_names, comments, options):
+        """Generate listings and reviews with bulk_create inside one transaction.
+
+        Coordinates are scattered around the sample cities, and the location
+        columns (geohash, sin/cos) and rating aggregates are computed here
+        because bulk_create skips save() and model signals.
+        """
+        rng = self.rng
+        total = options['services']
+        batch_size = options['batch_size']
+        reviews_per_service = options['reviews_per_service']
+        created_services = created_reviews = 0
+        created_pks = []
+
+        with transaction.atomic():
+            while created_services < total:
+                size = min(batch_size, total - created_services)
+                listings = []
+                listing_ratings = []
+                for _ in range(size):
+                    category = rng.choice(categories)
+                    loc = rng.choice(locations)
+                    provider_name = rng.choice(names)
+                    phone = rng.choice(phones)
+                    area = f"{loc['city']} {rng.choice(AREA_SUFFIXES)}"
+                    latitude = longitude = None
+                    if rng.random() >= options['unlocated_ratio']:
+                        # Roughly a 15 km spread around the city centre
+                        latitude = round(loc['lat'] + rng.gauss(0, 0.08), 6)
+                        longitude = round(loc['lng'] + rng.gauss(0, 0.08), 6)
+                    ratings = [rng.randint(1, 5) for _ in range(rng.randint(0, 2 * reviews_per_service))]
+                    listing = ServiceListing(
+                        service_name=f'{rng.choice(SERVICE_ADJECTIVES)} {category.name}',
+                        provider_name=provider_name,
+                        contact_info=f'Contact: {phone}',
+                        email=f'{provider_name.replace(" ", "").lower()}{rng.randint(1, 9999)}@example.com',
+                        phone=phone,
+                        description=f"{category.name} by {provider_name} serving {area}. {category.description}.",
+                        location_area=area,
+                        latitude=latitude,
+                        longitude=longitude,
+                        category=category,
+                        price_range=f'₹{rng.randint(2, 20) * 100}-{rng.randint(21, 60) * 100}',
+                        rating_sum=sum(ratings),
+                        rating_count=len(ratings),
+                        rating_average=round(sum(ratings) / len(ratings), 1) if ratings else 0,
+                    )
+                    listing.update_location_fields()
+                    listings.append(listing)
+                    listing_ratings.append(ratings)
+
+                ServiceListing.objects.bulk_create(listings, batch_size=batch_size)
+                created_pks.extend(listing.pk for listing in listings)
+                reviews = [
+                    Review(
+                        service_listing=listing,
+                        reviewer_name=rng.choice(reviewer_names),
+                        rating=rating,
+                        comment=rng.choice(comments),
+                    )
+                    for listing, ratings in zip(listings, listing_ratings)
+                    for rating in ratings
+                ]
+                Review.objects.bulk_create(reviews, batch_size=batch_size)
+                created_services += size
+                created_reviews += len(reviews)
+                self.stdout.write(f'Generated {created_services}/{total} services, {created_reviews} reviews')
+
+        # bulk_create skips the signals that maintain these
+        get_search_backend().reindex(created_pks)
+        Category.refresh_listing_counts()
+        invalidate_home()
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from services.review_queue import DEFAULT_BATCH_SIZE, apply_pending_reviews
+
+
+class Command(BaseCommand):
+    help = 'Apply queued reviews in batches (REVIEW_INGESTION = "queued")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Reviews applied per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling for new reviews')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be >= 1')
+        total = 0
+        while True:
+            applied = apply_pending_reviews(options['batch_size'])
+            total += applied
+            if applied:
+                self.stdout.write(f'Applied {applied} review(s)')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Applied {total} queued review(s).'))
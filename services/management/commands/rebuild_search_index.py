@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from services.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the service search index (needed after bulk loads that skip model signals)'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the {backend.name} search index.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from services.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored listing counts on every category'
+
+    def handle(self, *args, **options):
+        repaired = Category.refresh_listing_counts()
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} categor{"y" if repaired == 1 else "ies"} with stale listing counts.'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from services.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized top-rated and trending rankings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every category, not only the stale ones')
+        parser.add_argument('--loop', action='store_true', help='Keep running, refreshing every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300.0, help='Seconds between refreshes with --loop')
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0:
+            raise CommandError('--interval must be > 0')
+        full = options['all']
+        while True:
+            refreshed = refresh_rankings(full=full)
+            self.stdout.write(f'Recomputed top-rated rankings for {refreshed} categor{"y" if refreshed == 1 else "ies"}; trending refreshed.')
+            if not options['loop']:
+                break
+            full = False
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Rankings are up to date.'))
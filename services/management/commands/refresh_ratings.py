@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from services.models import ServiceListing
+from services.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating aggregates on every service listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted listings without fixing them')
+
+    def handle(self, *args, **options):
+        listings = ServiceListing.objects.annotate(
+            total=Sum('reviews__rating'), count=Count('reviews')
+        ).only('pk', 'rating_sum', 'rating_count', 'rating_average')
+
+        repaired = 0
+        with transaction.atomic():
+            for service in listings.iterator(chunk_size=2000):
+                total = service.total or 0
+                average = round(total / service.count, 1) if service.count else 0
+                if (service.rating_sum, service.rating_count, service.rating_average) == (total, service.count, average):
+                    continue
+                repaired += 1
+                if options['dry_run']:
+                    self.stdout.write(f'Drifted: listing {service.pk}')
+                    continue
+                ServiceListing.objects.filter(pk=service.pk).update(
+                    rating_sum=total, rating_count=service.count, rating_average=average
+                )
+
+        if repaired and not options['dry_run']:
+            # Top-rated rankings were scored from the drifted aggregates
+            refresh_rankings(full=True)
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {repaired} listing(s) with stale rating aggregates.'))
@@ -0,0 +1,184 @@
+"""Per-request SQL and timing instrumentation.
+
+``RequestProfilerMiddleware`` samples a share of requests and, for each
+sampled one, records the number of queries, total DB time, repeated
+queries (the usual N+1 signature), template render time and overall time.
+Results go to the ``services.profiler`` logger (at DEBUG, or WARNING for
+slow requests and repeated queries) and, optionally, to a
+``Server-Timing`` response header. Unsampled requests only pay for one
+random number and one context variable lookup per query. Works under both
+WSGI and ASGI.
+
+Configured with ``settings.REQUEST_PROFILER``::
+
+    REQUEST_PROFILER = {
+        'SAMPLE_RATE': 0.01,        # share of requests profiled
+        'RESPONSE_HEADER': False,   # add Server-Timing / X-Query-Count
+        'SLOW_REQUEST_MS': 500,     # log at WARNING above this
+        'DUPLICATE_THRESHOLD': 3,   # a query repeated this often is flagged
+    }
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+
+
+logger = logging.getLogger('services.profiler')
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.0,
+    'RESPONSE_HEADER': False,
+    'SLOW_REQUEST_MS': 500,
+    'DUPLICATE_THRESHOLD': 3,
+}
+
+_active_profile = ContextVar('active_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.statements = Counter()
+
+    def run_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+def _profile_queries(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; inert outside sampled requests.
+
+    The active profile lives in a context variable, which asgiref carries
+    into ``sync_to_async`` threads, so async ORM calls are counted too.
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.run_query(execute, sql, params, many, context)
+
+
+def _install_query_timer(sender=None, connection=None, **kwargs):
+    if _profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_queries)
+
+
+def _install_template_timer():
+    """Wrap Template.render once so sampled requests can time rendering.
+
+    Only the outermost render is timed; included templates are part of it.
+    """
+    if getattr(Template.render, '_profiled', False):
+        return
+    original_render = Template.render
+
+    def render(self, context):
+        profile = _active_profile.get()
+        if profile is None:
+            return original_render(self, context)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if profile.template_depth == 0:
+                profile.template_time += time.perf_counter() - start
+
+    render._profiled = True
+    Template.render = render
+
+
+class RequestProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILER', {})}
+        _install_template_timer()
+        connection_created.connect(_install_query_timer, dispatch_uid='services.profiler')
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection=connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        self.report(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        self.report(request, response, profile, time.perf_counter() - start)
+        return response
+
+    def report(self, request, response, profile, total):
+        total_ms = total * 1000
+        db_ms = profile.db_time * 1000
+        template_ms = profile.template_time * 1000
+        # Time spent in Python outside the DB and templates, i.e. the view itself
+        view_ms = max(0.0, total_ms - db_ms - template_ms)
+        duplicates = profile.duplicates(self.config['DUPLICATE_THRESHOLD'])
+
+        if self.config['RESPONSE_HEADER']:
+            response.headers['Server-Timing'] = ', '.join([
+                f'total;dur={total_ms:.1f}',
+                f'db;dur={db_ms:.1f};desc="{profile.query_count} queries"',
+                f'view;dur={view_ms:.1f}',
+                f'tpl;dur={template_ms:.1f}',
+            ])
+            response.headers['X-Query-Count'] = str(profile.query_count)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'view_ms': round(view_ms, 2),
+            'template_ms': round(template_ms, 2),
+            'queries': profile.query_count,
+            'duplicate_queries': [{'sql': sql[:200], 'count': count} for sql, count in duplicates.items()],
+        }
+        level = logging.WARNING if duplicates or total_ms >= self.config['SLOW_REQUEST_MS'] else logging.DEBUG
+        logger.log(level, json.dumps(record))
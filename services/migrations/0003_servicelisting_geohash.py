@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+from services.geo import encode_geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    ServiceListing = apps.get_model('services', 'ServiceListing')
+    located = ServiceListing.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for service in located.only('pk', 'latitude', 'longitude').iterator():
+        service.geohash = encode_geohash(service.latitude, service.longitude)
+        service.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_servicelisting_latitude_servicelisting_longitude'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicelisting',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Geohash cell of latitude/longitude, empty when not located', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
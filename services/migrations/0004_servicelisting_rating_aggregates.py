@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    ServiceListing = apps.get_model('services', 'ServiceListing')
+    rated = ServiceListing.objects.annotate(total=Sum('reviews__rating'), count=Count('reviews')).filter(count__gt=0)
+    for service in rated.iterator():
+        ServiceListing.objects.filter(pk=service.pk).update(
+            rating_sum=service.total,
+            rating_count=service.count,
+            rating_average=round(service.total / service.count, 1),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0003_servicelisting_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicelisting',
+            name='rating_average',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='servicelisting',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='servicelisting',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
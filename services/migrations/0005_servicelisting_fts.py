@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from services.search import FTS_TABLE, SEARCH_FIELDS, create_fts_table, drop_fts_table, fts5_available
+
+
+def create_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if not fts5_available(conn):
+        # The in-process inverted index is used instead
+        return
+    create_fts_table(conn)
+    columns = ', '.join(SEARCH_FIELDS)
+    table = apps.get_model('services', 'ServiceListing')._meta.db_table
+    schema_editor.execute(f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table}')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_fts_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0004_servicelisting_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0005_servicelisting_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['service_listing', '-created_at', '-id'], name='review_listing_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['-created_at', '-id'], name='listing_available_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['category', '-created_at', '-id'], name='listing_category_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(fields=['is_available', 'category', '-created_at'], name='listing_filter_recent_idx'),
+        ),
+    ]
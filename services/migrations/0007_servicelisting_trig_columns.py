@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+from services.geo import trig_columns
+
+
+def backfill_trig_columns(apps, schema_editor):
+    ServiceListing = apps.get_model('services', 'ServiceListing')
+    located = ServiceListing.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for service in located.only('pk', 'latitude', 'longitude').iterator():
+        ServiceListing.objects.filter(pk=service.pk).update(**trig_columns(service.latitude, service.longitude))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0006_listing_and_review_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicelisting',
+            name='lat_cos',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicelisting',
+            name='lat_sin',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicelisting',
+            name='lng_cos',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicelisting',
+            name='lng_sin',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_trig_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_listing_counts(apps, schema_editor):
+    Category = apps.get_model('services', 'Category')
+    counts = Category.objects.annotate(
+        total=Count('services'), available=Count('services', filter=Q(services__is_available=True)))
+    for category in counts.iterator():
+        Category.objects.filter(pk=category.pk).update(listing_count=category.total, available_count=category.available)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_servicelisting_trig_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='available_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='listing_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_listing_counts, migrations.RunPython.noop),
+    ]
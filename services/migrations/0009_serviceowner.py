@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0008_category_listing_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceOwner',
+            fields=[
+                ('service', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='owner', serialize=False, to='services.servicelisting')),
+                ('token_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
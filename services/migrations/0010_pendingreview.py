@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0009_serviceowner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviewer_name', models.CharField(max_length=100)),
+                ('rating', models.IntegerField(choices=[(1, '1 Star'), (2, '2 Stars'), (3, '3 Stars'), (4, '4 Stars'), (5, '5 Stars')], validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)])),
+                ('comment', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('service_listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_reviews', to='services.servicelisting')),
+            ],
+        ),
+    ]
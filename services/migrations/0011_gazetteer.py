@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+from services.geocoding import normalize, read_gazetteer
+
+
+def seed_gazetteer(apps, schema_editor):
+    Place = apps.get_model('services', 'Place')
+    Place.objects.bulk_create(
+        [Place(name=normalize(name), display_name=name, kind=kind, latitude=latitude, longitude=longitude)
+         for name, kind, latitude, longitude in read_gazetteer()],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0010_pendingreview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="Normalized name, e.g. 'connaught place'", max_length=200, unique=True)),
+                ('display_name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('locality', 'Locality'), ('city', 'City')], default='locality', max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='servicelisting',
+            name='geocoded',
+            field=models.BooleanField(default=False, editable=False, help_text='Coordinates were looked up from location_area in the gazetteer'),
+        ),
+        migrations.RunPython(seed_gazetteer, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0011_gazetteer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('top_rated', 'Top Rated'), ('trending', 'Trending')], max_length=20)),
+                ('position', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'ordering': ['kind', 'category', 'position'],
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='rankings_stale',
+            field=models.BooleanField(default=True, editable=False, help_text='Top-rated ranking needs recomputing (see services.rankings)'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['-created_at'], name='review_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='serviceranking',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='services.category'),
+        ),
+        migrations.AddField(
+            model_name='serviceranking',
+            name='service_listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='services.servicelisting'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceranking',
+            index=models.Index(fields=['kind', 'category', 'position'], name='ranking_position_idx'),
+        ),
+    ]
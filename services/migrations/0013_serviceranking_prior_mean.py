@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0012_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceranking',
+            name='prior_mean',
+            field=models.FloatField(blank=True, help_text='Site-wide mean rating the top-rated score was computed with', null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0013_serviceranking_prior_mean'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('top_rated', 'Top Rated'), ('trending', 'Trending')], max_length=20)),
+                ('refreshed_at', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='services.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'category'], name='ranking_refresh_idx')],
+            },
+        ),
+    ]
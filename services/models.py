@@ -1,12 +1,20 @@
 from django.db import models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .geo import encode_geohash, trig_columns
+from .geocoding import geocode, normalize
 
 
 class Category(models.Model):
     """Model for service categories like 'Tutoring', 'Home Repair', 'Pet Care'"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
+    listing_count = models.PositiveIntegerField(default=0, editable=False)
+    available_count = models.PositiveIntegerField(default=0, editable=False)
+    rankings_stale = models.BooleanField(default=True, editable=False,
+                                         help_text="Top-rated ranking needs recomputing (see services.rankings)")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -15,6 +23,51 @@ class Category(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def apply_listing_change(cls, before, after):
+        """Adjust stored counts for a listing moving from ``before`` to ``after``.
+        
+        Each state is ``(category_id, is_available)``, or None for a listing
+        that did not exist before / no longer exists.
+        """
+        deltas = {}
+        for state, step in ((before, -1), (after, 1)):
+            if state is None:
+                continue
+            category_id, is_available = state
+            listings, available = deltas.get(category_id, (0, 0))
+            deltas[category_id] = (listings + step, available + (step if is_available else 0))
+        cls.adjust_counts(deltas)
+    
+    @classmethod
+    def adjust_counts(cls, deltas):
+        """Apply ``{category_id: (listings, available)}`` count changes with F() updates"""
+        for category_id, (listings, available) in deltas.items():
+            if listings or available:
+                cls.objects.filter(pk=category_id).update(
+                    listing_count=Greatest(F('listing_count') + listings, 0),
+                    available_count=Greatest(F('available_count') + available, 0),
+                )
+    
+    @classmethod
+    def refresh_listing_counts(cls, pks=None):
+        """Recompute stored counts with one grouped query, e.g. after bulk writes"""
+        categories = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        counts = {
+            row['category_id']: row
+            for row in ServiceListing.objects.filter(category__in=categories).values('category_id').annotate(
+                total=Count('id'), available=Count('id', filter=Q(is_available=True)))
+        }
+        changed = []
+        for category in categories:
+            row = counts.get(category.pk, {'total': 0, 'available': 0})
+            if (category.listing_count, category.available_count) != (row['total'], row['available']):
+                category.listing_count = row['total']
+                category.available_count = row['available']
+                changed.append(category)
+        cls.objects.bulk_update(changed, ['listing_count', 'available_count'])
+        return len(changed)
 
 
 class ServiceListing(models.Model):
@@ -28,30 +81,113 @@ class ServiceListing(models.Model):
     location_area = models.CharField(max_length=200)
     latitude = models.FloatField(blank=True, null=True, help_text="Service latitude (for sorting and maps)")
     longitude = models.FloatField(blank=True, null=True, help_text="Service longitude (for sorting and maps)")
+    geocoded = models.BooleanField(default=False, editable=False,
+                                   help_text="Coordinates were looked up from location_area in the gazetteer")
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False,
+                               help_text="Geohash cell of latitude/longitude, empty when not located")
+    # sin/cos of the coordinates, so radius filters can run in SQL (see geo.within_radius)
+    lat_sin = models.FloatField(blank=True, null=True, editable=False)
+    lat_cos = models.FloatField(blank=True, null=True, editable=False)
+    lng_sin = models.FloatField(blank=True, null=True, editable=False)
+    lng_cos = models.FloatField(blank=True, null=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='services')
     price_range = models.CharField(max_length=100, blank=True, help_text="e.g., '$20-50/hour', 'Starting at $30'")
     is_available = models.BooleanField(default=True)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listing pages: available listings, newest first (optionally per category).
+            # Partial indexes where the backend supports them, plus a plain composite fallback.
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_available=True),
+                         name='listing_available_recent_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=Q(is_available=True),
+                         name='listing_category_recent_idx'),
+            models.Index(fields=['is_available', 'category', '-created_at'], name='listing_filter_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.service_name} by {self.provider_name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.counted_state = instance.count_state()
+        if 'latitude' in instance.__dict__ and 'longitude' in instance.__dict__:
+            instance.loaded_coordinates = (instance.latitude, instance.longitude)
+        return instance
+    
+    def count_state(self):
+        """``(category_id, is_available)`` as counted by Category, None if not loaded"""
+        if 'category_id' not in self.__dict__ or 'is_available' not in self.__dict__:
+            return None
+        return self.category_id, self.is_available
+    
+    LOCATION_FIELDS = ('geohash', 'lat_sin', 'lat_cos', 'lng_sin', 'lng_cos')
+    
+    def save(self, *args, **kwargs):
+        self.fill_coordinates()
+        self.update_location_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude', 'location_area'} & set(update_fields):
+            kwargs['update_fields'] = (set(update_fields) | {'latitude', 'longitude', 'geocoded'}
+                                       | set(self.LOCATION_FIELDS))
+        super().save(*args, **kwargs)
+        self.loaded_coordinates = (self.latitude, self.longitude)
+    
+    def fill_coordinates(self):
+        """Geocode location_area when the listing has no coordinates of its own"""
+        if self.geocoded and getattr(self, 'loaded_coordinates', None) == (self.latitude, self.longitude):
+            # Still the looked-up coordinates, so follow changes to location_area
+            self.latitude = self.longitude = None
+        if self.latitude is not None and self.longitude is not None:
+            if getattr(self, 'loaded_coordinates', None) != (self.latitude, self.longitude):
+                self.geocoded = False
+            return
+        point = geocode(self.location_area)
+        self.latitude, self.longitude = point if point else (None, None)
+        self.geocoded = point is not None
+    
+    def compute_geohash(self):
+        """Geohash for the current coordinates (empty if not located)"""
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return encode_geohash(self.latitude, self.longitude)
+    
+    def update_location_fields(self):
+        """Set the geohash and trig columns derived from latitude/longitude"""
+        self.geohash = self.compute_geohash()
+        located = self.latitude is not None and self.longitude is not None
+        trig = trig_columns(self.latitude, self.longitude) if located else dict.fromkeys(self.LOCATION_FIELDS[1:])
+        for field, value in trig.items():
+            setattr(self, field, value)
+    
     @property
     def average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews:
-            return round(sum(review.rating for review in reviews) / len(reviews), 1)
-        return 0
+        """Average rating, maintained from reviews (see refresh_rating_aggregates)"""
+        return self.rating_average
     
     @property
     def review_count(self):
-        """Get total number of reviews"""
-        return self.reviews.count()
+        """Total number of reviews, maintained from reviews"""
+        return self.rating_count
+    
+    def refresh_rating_aggregates(self):
+        """Recompute the stored rating sum, count and average from reviews"""
+        totals = self.reviews.aggregate(total=Sum('rating'), count=Count('id'))
+        self.rating_sum = totals['total'] or 0
+        self.rating_count = totals['count']
+        self.rating_average = round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0
+        ServiceListing.objects.filter(pk=self.pk).update(
+            rating_sum=self.rating_sum,
+            rating_count=self.rating_count,
+            rating_average=self.rating_average,
+        )
 
 
 class Review(models.Model):
@@ -72,6 +208,108 @@ class Review(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['service_listing', '-created_at', '-id'], name='review_listing_recent_idx'),
+            # Trending rankings count the reviews in a recent window
+            models.Index(fields=['-created_at'], name='review_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.rating}-star review for {self.service_listing.service_name} by {self.reviewer_name}"
+
+
+class ServiceOwner(models.Model):
+    """Ownership of a listing, keyed by the listing's id.
+    
+    ``token_hash`` is an HMAC of the owner key held in the creator's session
+    (see ``services.ownership``), so one session value covers any number of
+    listings and checking ownership is a primary-key lookup.
+    """
+    service = models.OneToOneField(ServiceListing, on_delete=models.CASCADE, primary_key=True, related_name='owner')
+    token_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Owner of {self.service_id}"
+
+
+class PendingReview(models.Model):
+    """Review accepted but not yet applied (see ``services.review_queue``).
+    
+    Append-only: rows are inserted by the detail view and removed by the
+    worker once copied into ``Review``.
+    """
+    service_listing = models.ForeignKey(ServiceListing, on_delete=models.CASCADE, related_name='pending_reviews')
+    reviewer_name = models.CharField(max_length=100)
+    rating = models.IntegerField(choices=Review.RATING_CHOICES, validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Pending {self.rating}-star review for listing {self.service_listing_id} by {self.reviewer_name}"
+
+
+class Place(models.Model):
+    """Gazetteer entry used to geocode location_area text (see ``services.geocoding``)"""
+    KIND_CHOICES = [
+        ('locality', 'Locality'),
+        ('city', 'City'),
+    ]
+    
+    name = models.CharField(max_length=200, unique=True, help_text="Normalized name, e.g. 'connaught place'")
+    display_name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='locality')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.display_name
+    
+    def save(self, *args, **kwargs):
+        self.name = normalize(self.name or self.display_name)
+        super().save(*args, **kwargs)
+
+
+class ServiceRanking(models.Model):
+    """One position in a materialized ranking (see ``services.rankings``).
+    
+    Rankings are kept per category, plus a site-wide one with no category.
+    """
+    KIND_CHOICES = [
+        ('top_rated', 'Top Rated'),
+        ('trending', 'Trending'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='rankings')
+    service_listing = models.ForeignKey(ServiceListing, on_delete=models.CASCADE, related_name='rankings')
+    position = models.PositiveIntegerField()
+    score = models.FloatField()
+    prior_mean = models.FloatField(null=True, blank=True, help_text="Site-wide mean rating the top-rated score was computed with")
+    
+    class Meta:
+        ordering = ['kind', 'category', 'position']
+        indexes = [
+            models.Index(fields=['kind', 'category', 'position'], name='ranking_position_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.position}: listing {self.service_listing_id}"
+
+
+class RankingRefresh(models.Model):
+    """When a ranking was last computed, so an empty one is told apart from a missing one"""
+    kind = models.CharField(max_length=20, choices=ServiceRanking.KIND_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    refreshed_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'category'], name='ranking_refresh_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} refreshed {self.refreshed_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,61 @@
+"""Anonymous listing ownership.
+
+Each browser that creates a listing gets one random owner key in its
+session, written once. Listings record an HMAC of that key in the
+``ServiceOwner`` table, so checking ownership is a primary-key lookup and
+creating or deleting listings never rewrites the session.
+
+Sessions from before this scheme kept an ``owned_services`` dict; it is
+moved into the table the first time such a session is seen.
+"""
+import secrets
+
+from django.utils.crypto import salted_hmac
+
+from .models import ServiceListing, ServiceOwner
+
+
+SESSION_KEY = 'owner_key'
+LEGACY_SESSION_KEY = 'owned_services'
+HMAC_SALT = 'services.ownership'
+
+
+def token_hash(owner_key):
+    return salted_hmac(HMAC_SALT, owner_key, algorithm='sha256').hexdigest()
+
+
+def _migrate_legacy(owner_key, service_ids):
+    """Record ownership for the listings listed in an old ``owned_services`` session dict"""
+    ids = [int(pk) for pk in service_ids if str(pk).isdigit()]
+    existing = ServiceListing.objects.filter(pk__in=ids).values_list('pk', flat=True)
+    digest = token_hash(owner_key)
+    ServiceOwner.objects.bulk_create(
+        [ServiceOwner(service_id=pk, token_hash=digest) for pk in existing],
+        ignore_conflicts=True,
+    )
+
+
+def get_owner_key(request, create=False):
+    """This browser's owner key, or None if it has never created a listing"""
+    session = request.session
+    owner_key = session.get(SESSION_KEY)
+    legacy = session.get(LEGACY_SESSION_KEY)
+    if owner_key is None and (create or legacy):
+        owner_key = session[SESSION_KEY] = secrets.token_urlsafe(32)
+    if legacy is not None:
+        _migrate_legacy(owner_key, legacy)
+        del session[LEGACY_SESSION_KEY]
+    return owner_key
+
+
+def is_service_owner(request, service):
+    """Check if the current session owns this service"""
+    owner_key = get_owner_key(request)
+    if owner_key is None:
+        return False
+    return ServiceOwner.objects.filter(service_id=service.pk, token_hash=token_hash(owner_key)).exists()
+
+
+def claim_service(request, service):
+    """Make the current session the owner of a newly created service"""
+    ServiceOwner.objects.create(service=service, token_hash=token_hash(get_owner_key(request, create=True)))
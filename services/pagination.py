@@ -0,0 +1,251 @@
+"""Keyset (cursor) pagination for service listings.
+
+Listings are ordered by ``(-created_at, -id)``, so a page can be fetched by
+seeking past the last row of the previous one instead of using ``OFFSET``,
+and no ``COUNT(*)`` is needed. Page-number links keep working for the first
+``PAGE_NUMBER_LIMIT`` pages; from there on "Next" switches to cursors, and
+deeper page numbers are served as page ``PAGE_NUMBER_LIMIT``.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, QuerySet
+from django.utils.functional import cached_property
+
+
+PAGE_NUMBER_LIMIT = 5
+KEYSET_ORDERING = ('-created_at', '-id')
+
+# Below this many rows an exact COUNT(*) is cheap enough
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def encode_cursor(service, direction):
+    """Opaque token pointing just past ``service`` in the given direction"""
+    raw = f'{direction}|{service.created_at.isoformat()}|{service.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (direction, created_at, pk) or None for a malformed token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def supports_keyset(object_list):
+    """Keyset pagination only applies to querysets in their default order"""
+    return isinstance(object_list, QuerySet) and not object_list.query.order_by
+
+
+class KeysetPage:
+    """A page of results fetched by cursor; mirrors the parts of ``Page`` templates use"""
+
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Seek-based paginator over a queryset ordered by ``(-created_at, -id)``"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.order_by(*KEYSET_ORDERING)
+        self.per_page = per_page
+
+    def _window(self, token):
+        """Queryset for the rows to fetch (one extra to detect more), plus the direction"""
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self.queryset[:self.per_page + 1], None
+        direction, created_at, pk = cursor
+        if direction == 'next':
+            # Written as a range plus an exclusion (not an OR) so the
+            # (created_at, id) index can seek straight to the cursor
+            rows = self.queryset.filter(created_at__lte=created_at).exclude(
+                created_at=created_at, id__gte=pk
+            )
+        else:
+            rows = self.queryset.filter(created_at__gte=created_at).exclude(
+                created_at=created_at, id__lte=pk
+            ).order_by('created_at', 'id')
+        return rows[:self.per_page + 1], direction
+
+    def _page_from_rows(self, rows, direction):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction is None:
+            return self._build(rows, has_next=has_more, has_previous=False)
+        if direction == 'next':
+            return self._build(rows, has_next=has_more, has_previous=True)
+        return self._build(rows[::-1], has_next=True, has_previous=has_more)
+
+    def page(self, token):
+        rows, direction = self._window(token)
+        return self._page_from_rows(list(rows), direction)
+
+    async def apage(self, token):
+        rows, direction = self._window(token)
+        return self._page_from_rows([row async for row in rows], direction)
+
+    def _build(self, rows, has_next, has_previous):
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
+
+
+def _mark_page(page_obj, keyset):
+    page_obj.is_keyset = False
+    # A "Last" link would be a deep OFFSET; keyset lists reach it by cursor
+    page_obj.has_last_link = not keyset
+    page_obj.next_cursor = None
+    if keyset and page_obj.number >= PAGE_NUMBER_LIMIT and page_obj.has_next():
+        page_obj.next_cursor = encode_cursor(page_obj[-1], 'next')
+    return page_obj
+
+
+def _page_number(request, keyset):
+    """The requested page number, capped at ``PAGE_NUMBER_LIMIT`` for keyset lists"""
+    number = request.GET.get('page')
+    if keyset and number and number.isdigit() and int(number) > PAGE_NUMBER_LIMIT:
+        return PAGE_NUMBER_LIMIT
+    return number
+
+
+def paginate(request, object_list, per_page, count=None):
+    """Paginate listings by cursor when requested, else by page number.
+
+    Page-number pages at or beyond ``PAGE_NUMBER_LIMIT`` carry a
+    ``next_cursor`` so deeper navigation moves onto cursors. A known
+    ``count`` (e.g. a stored category count) saves the ``COUNT(*)``.
+    """
+    keyset = supports_keyset(object_list)
+    if keyset and 'cursor' in request.GET:
+        return KeysetPaginator(object_list, per_page).page(request.GET.get('cursor'))
+
+    if keyset:
+        object_list = object_list.order_by(*KEYSET_ORDERING)
+    paginator = Paginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+    return _mark_page(paginator.get_page(_page_number(request, keyset)), keyset)
+
+
+async def apaginate(request, object_list, per_page, count=None):
+    """Async ``paginate``; the returned page's rows are already fetched"""
+    keyset = supports_keyset(object_list)
+    if keyset and 'cursor' in request.GET:
+        return await KeysetPaginator(object_list, per_page).apage(request.GET.get('cursor'))
+    if not isinstance(object_list, QuerySet):
+        # e.g. NearestResults, which only has a sync interface
+        return await sync_to_async(_fetched_page)(request, object_list, per_page)
+
+    if keyset:
+        object_list = object_list.order_by(*KEYSET_ORDERING)
+    paginator = Paginator(object_list, per_page)
+    # Prime the cached count so page-number validation runs no sync query
+    paginator.count = count if count is not None else await object_list.acount()
+    try:
+        number = paginator.validate_number(_page_number(request, keyset) or 1)
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+    bottom = (number - 1) * per_page
+    rows = [row async for row in object_list[bottom:bottom + per_page]]
+    return _mark_page(Page(rows, number, paginator), keyset)
+
+
+def _fetched_page(request, object_list, per_page):
+    page_obj = paginate(request, object_list, per_page)
+    page_obj.object_list = list(page_obj.object_list)
+    return page_obj
+
+
+def base_querystring(request):
+    """Current query string without pagination parameters"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+def estimated_row_count(model, using='default'):
+    """Approximate row count of a model's table without scanning it.
+
+    Uses the planner statistics where the database keeps them (PostgreSQL's
+    ``reltuples``, SQLite's ``sqlite_stat1`` after ``ANALYZE``), falling back
+    to the highest primary key, which is an index lookup. SQLite keeps one
+    row per index and a partial index only counts its own rows, so the
+    largest is taken.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table]),
+        'sqlite': ('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table]),
+    }
+    if connection.vendor in queries:
+        sql, params = queries[connection.vendor]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        except DatabaseError:
+            rows = []
+        estimate = max((int(str(stat).split()[0]) for stat, in rows if stat is not None), default=0)
+        if estimate > 0:
+            return estimate
+    return model._default_manager.using(using).aggregate(top=Max('pk'))['top'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists over large tables.
+
+    An unfiltered changelist gets its total from ``estimated_row_count``
+    instead of ``COUNT(*)``; filtered or small result sets are counted
+    exactly.
+    """
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if isinstance(object_list, QuerySet) and not object_list.query.where:
+            estimate = estimated_row_count(object_list.model, object_list.db)
+            if estimate > EXACT_COUNT_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,224 @@
+"""Materialized "top rated" and "trending" rankings.
+
+``ServiceRanking`` holds the first ``RANKING_SIZE`` listings of each ranking
+for every category, plus a site-wide list (``category=None``) merged from
+the per-category ones. The ``top_rated`` and ``trending`` sorts of the
+listing pages join that table and order by ``position``, so no request
+aggregates reviews; listings outside the ranking follow, newest first, so
+a search or filter combined with a ranked sort keeps all its matches.
+``RankingRefresh`` records which rankings have been computed, and only
+until then (e.g. right after migrating) are the listings ordered live.
+
+* Top rated orders by Bayesian average: a listing's ratings blended with
+  ``RANKING_PRIOR_REVIEWS`` virtual reviews at the site-wide mean, so one
+  five-star review does not outrank a long record of 4.8s. Scores come from
+  the stored rating aggregates, and only categories flagged
+  ``rankings_stale`` (by review and listing changes) are recomputed. The
+  mean is rounded to two decimals and stored on the rows scored with it;
+  when it moves, every category is rescored, so all scores share one prior.
+* Trending orders by reviews received in the last ``TRENDING_WINDOW_DAYS``.
+  The window slides, so every refresh recomputes it from a range scan of
+  the recent reviews.
+
+``python manage.py refresh_rankings --loop`` keeps both current.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Category, RankingRefresh, Review, ServiceListing, ServiceRanking
+from .pagination import KEYSET_ORDERING
+
+
+RANKED_SORTS = ('top_rated', 'trending')
+
+
+def ranking_size():
+    return getattr(settings, 'RANKING_SIZE', 100)
+
+
+def mark_stale(category_ids):
+    """Flag categories whose top-rated ranking may have changed"""
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if category_ids:
+        Category.objects.filter(pk__in=category_ids, rankings_stale=False).update(rankings_stale=True)
+
+
+def ranked_services(queryset, sort, category_id=None):
+    """``queryset`` in rank order: a ``RankedResults``, or a live queryset if never computed.
+
+    Other filters on ``queryset`` still apply, e.g. a search within the
+    top-rated listings.
+    """
+    category_id = category_id or None
+    if not RankingRefresh.objects.filter(kind=sort, category_id=category_id).exists():
+        return live_ranked_services(queryset, sort)
+    return RankedResults(queryset, sort, category_id)
+
+
+def live_ranked_services(queryset, sort):
+    """``queryset`` in ranking order computed on the fly, for rankings not refreshed yet"""
+    if sort == 'top_rated':
+        score = Case(When(rating_count__gt=0, then=_bayesian_score(prior_mean())), output_field=FloatField())
+        ranking = queryset.annotate(ranking_score=score)
+        return ranking.order_by(F('ranking_score').desc(nulls_last=True), *KEYSET_ORDERING)
+    recent = Count('reviews', filter=Q(reviews__created_at__gte=_trending_since()))
+    return queryset.annotate(recent_reviews=recent).order_by('-recent_reviews', *KEYSET_ORDERING)
+
+
+class RankedResults:
+    """Lazy, sliceable view of a queryset in the order of a stored ranking.
+
+    Listings in the ranking come first, by position (an index range on
+    ``ServiceRanking``); the rest follow newest first. Like
+    ``NearestResults`` it is meant to be handed to ``Paginator``.
+    """
+
+    def __init__(self, queryset, sort, category_id=None):
+        self.queryset = queryset
+        self.model = queryset.model
+        rankings = ServiceRanking.objects.filter(kind=sort, category_id=category_id)
+        self.ranked = queryset.filter(rankings__kind=sort, rankings__category_id=category_id).order_by(
+            'rankings__position')
+        self.unranked = queryset.exclude(pk__in=rankings.values('service_listing_id')).order_by(*KEYSET_ORDERING)
+        self._count = None
+        self._ranked_count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ranked_count(self):
+        if self._ranked_count is None:
+            self._ranked_count = self.ranked.count()
+        return self._ranked_count
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            items = self[key:key + 1]
+            if not items:
+                raise IndexError(key)
+            return items[0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if stop <= start:
+            return []
+
+        ranked = self.ranked_count()
+        results = []
+        if start < ranked:
+            results = list(self.ranked[start:min(stop, ranked)])
+        if stop > ranked:
+            results += self.unranked[max(0, start - ranked):stop - ranked]
+        return results
+
+
+def prior_mean():
+    """Site-wide average rating, from the stored aggregates, to two decimals"""
+    totals = ServiceListing.objects.aggregate(total=Sum('rating_sum'), count=Sum('rating_count'))
+    return round(totals['total'] / totals['count'], 2) if totals['count'] else 0.0
+
+
+def _bayesian_score(mean):
+    prior_reviews = float(getattr(settings, 'RANKING_PRIOR_REVIEWS', 5))
+    return (Value(prior_reviews * mean) + F('rating_sum')) / (Value(prior_reviews) + F('rating_count'))
+
+
+def _trending_since():
+    return timezone.now() - timedelta(days=getattr(settings, 'TRENDING_WINDOW_DAYS', 7))
+
+
+def _top_rated(category_ids, size, mean):
+    """``(category_id, pk, score, position)`` rows of the top-rated rankings"""
+    return (
+        ServiceListing.objects.filter(is_available=True, rating_count__gt=0, category_id__in=category_ids)
+        .annotate(score=_bayesian_score(mean))
+        .annotate(position=Window(RowNumber(), partition_by=F('category_id'),
+                                  order_by=[F('score').desc(), F('pk').desc()]))
+        .filter(position__lte=size)
+        .values_list('category_id', 'pk', 'score', 'position')
+    )
+
+
+def _trending(size):
+    """``(category_id, pk, score, position)`` rows of the trending rankings"""
+    counts = (
+        Review.objects.filter(created_at__gte=_trending_since(), service_listing__is_available=True)
+        .values_list('service_listing__category_id', 'service_listing_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    by_category = defaultdict(list)
+    for category_id, pk, n in counts:
+        by_category[category_id].append((n, pk))
+    return [
+        (category_id, pk, float(n), position)
+        for category_id, items in by_category.items()
+        for position, (n, pk) in enumerate(heapq.nlargest(size, items), start=1)
+    ]
+
+
+def _replace(kind, rows, categories=None, mean=None):
+    """Swap in new per-category rows, then rebuild the site-wide list from them.
+
+    ``categories`` are the ones recomputed, all of them if None; they and
+    the site-wide list are recorded as refreshed, even when left empty.
+    """
+    stale_rows = ServiceRanking.objects.filter(kind=kind)
+    if categories is not None:
+        stale_rows = stale_rows.filter(category_id__in=categories)
+    stale_rows.exclude(category=None).delete()
+    ServiceRanking.objects.bulk_create([
+        ServiceRanking(kind=kind, category_id=category_id, service_listing_id=pk, score=score, position=position,
+                       prior_mean=mean)
+        for category_id, pk, score, position in rows
+    ])
+
+    # The site-wide top N is always within the union of the per-category top Ns
+    candidates = ServiceRanking.objects.filter(kind=kind).exclude(category=None).values_list('score', 'service_listing_id')
+    top = heapq.nlargest(ranking_size(), candidates)
+    ServiceRanking.objects.filter(kind=kind, category=None).delete()
+    ServiceRanking.objects.bulk_create([
+        ServiceRanking(kind=kind, category=None, service_listing_id=pk, score=score, position=position,
+                       prior_mean=mean)
+        for position, (score, pk) in enumerate(top, start=1)
+    ])
+
+    if categories is None:
+        categories = list(Category.objects.values_list('pk', flat=True))
+    RankingRefresh.objects.filter(Q(category_id__in=categories) | Q(category=None), kind=kind).delete()
+    now = timezone.now()
+    RankingRefresh.objects.bulk_create([
+        RankingRefresh(kind=kind, category_id=category_id, refreshed_at=now) for category_id in [None, *categories]
+    ])
+
+
+def refresh_rankings(full=False):
+    """Recompute stale top-rated rankings (all of them with ``full``) and the trending ones.
+
+    Returns the number of categories whose top-rated ranking was recomputed.
+    """
+    size = ranking_size()
+    with transaction.atomic():
+        mean = prior_mean()
+        stored_mean = ServiceRanking.objects.filter(kind='top_rated').values_list('prior_mean', flat=True).first()
+        # Scores against a different prior are not comparable, so a new mean rescores everything
+        full = full or stored_mean != mean
+        categories = Category.objects.all() if full else Category.objects.filter(rankings_stale=True)
+        stale = list(categories.values_list('pk', flat=True))
+        # Cleared before recomputing, so a change made meanwhile flags the category again
+        Category.objects.filter(pk__in=stale).update(rankings_stale=False)
+        if stale:
+            _replace('top_rated', list(_top_rated(stale, size, mean)), stale, mean)
+        _replace('trending', _trending(size))
+    return len(stale)
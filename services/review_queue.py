@@ -0,0 +1,92 @@
+"""Buffered review ingestion.
+
+With ``settings.REVIEW_INGESTION = 'queued'`` a submitted review is only
+appended to ``PendingReview``, a single cheap insert. The
+``process_review_queue`` worker later copies pending reviews into ``Review``
+in batched transactions and folds each batch into the listings' stored
+rating aggregates with a single bulk UPDATE, then invalidates the home
+cache once. Until then the submitter sees their review, marked as pending,
+through the ids kept in their session.
+
+The default, ``'direct'``, saves the review in the request as before.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import invalidate_home
+from .models import PendingReview, Review, ServiceListing
+from .rankings import mark_stale as mark_rankings_stale
+
+
+SESSION_KEY = 'pending_reviews'
+DEFAULT_BATCH_SIZE = 500
+
+
+def queued():
+    return getattr(settings, 'REVIEW_INGESTION', 'direct') == 'queued'
+
+
+def submit_review(request, service, form):
+    """Store a validated ReviewForm, directly or through the queue"""
+    if not queued():
+        review = form.save(commit=False)
+        review.service_listing = service
+        review.save()
+        return
+    pending = PendingReview.objects.create(service_listing=service, **form.cleaned_data)
+    request.session[SESSION_KEY] = request.session.get(SESSION_KEY, []) + [pending.pk]
+
+
+def pending_reviews_for(request, service):
+    """This session's reviews of ``service`` that the worker has not applied yet"""
+    ids = request.session.get(SESSION_KEY)
+    if not ids:
+        return []
+    pending = list(PendingReview.objects.filter(pk__in=ids).order_by('-pk'))
+    still_pending = [review.pk for review in pending]
+    if len(still_pending) != len(ids):
+        # Forget the ones that have been applied
+        request.session[SESSION_KEY] = sorted(still_pending)
+    return [review for review in pending if review.service_listing_id == service.pk]
+
+
+def apply_pending_reviews(batch_size=DEFAULT_BATCH_SIZE):
+    """Move one batch of pending reviews into Review; returns how many were applied"""
+    with transaction.atomic():
+        pending = PendingReview.objects.order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the queue without taking the same rows
+            pending = pending.select_for_update(skip_locked=True)
+        batch = list(pending[:batch_size])
+        if not batch:
+            return 0
+
+        # bulk_create skips the per-review signal that recomputes aggregates
+        reviews = Review.objects.bulk_create([
+            Review(service_listing_id=item.service_listing_id, reviewer_name=item.reviewer_name,
+                   rating=item.rating, comment=item.comment)
+            for item in batch
+        ])
+        # auto_now_add stamped the reviews with the current time; keep the
+        # submission time instead, which trending and review order rely on
+        for review, item in zip(reviews, batch):
+            review.created_at = item.created_at
+        Review.objects.bulk_update(reviews, ['created_at'])
+        totals = defaultdict(lambda: [0, 0])
+        for item in batch:
+            totals[item.service_listing_id][0] += item.rating
+            totals[item.service_listing_id][1] += 1
+        listings = list(ServiceListing.objects.select_for_update().filter(pk__in=totals)
+                        .only('pk', 'category', 'rating_sum', 'rating_count', 'rating_average'))
+        for service in listings:
+            rating_sum, rating_count = totals[service.pk]
+            service.rating_sum += rating_sum
+            service.rating_count += rating_count
+            service.rating_average = round(service.rating_sum / service.rating_count, 1)
+        ServiceListing.objects.bulk_update(listings, ['rating_sum', 'rating_count', 'rating_average'])
+        mark_rankings_stale(service.category_id for service in listings)
+        PendingReview.objects.filter(pk__in=[item.pk for item in batch]).delete()
+    invalidate_home()
+    return len(batch)
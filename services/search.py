@@ -0,0 +1,415 @@
+"""Full-text search over service listings.
+
+Two backends share one interface:
+
+* ``FTS5SearchBackend`` keeps an SQLite FTS5 virtual table in sync with
+  ``ServiceListing`` and ranks matches with bm25.
+* ``InvertedIndexSearchBackend`` keeps an in-process inverted index. It is
+  used wherever FTS5 is unavailable (other databases, SQLite builds without
+  the extension) and is rebuilt in the background every
+  ``SEARCH_INDEX_TTL`` seconds so writes made by other worker processes are
+  picked up.
+
+``get_search_backend()`` picks one according to ``settings.SEARCH_BACKEND``
+(``'auto'``, ``'fts5'`` or ``'inverted'``).
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, DatabaseError, OperationalError, ProgrammingError
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_FIELDS = ('service_name', 'provider_name', 'description', 'location_area')
+FTS_TABLE = 'services_servicelisting_fts'
+# Listings re-read per statement by reindex()
+REINDEX_CHUNK_SIZE = 500
+
+# Field weights used for ranking; a name match counts more than a mention
+# in the description.
+FIELD_WEIGHTS = {
+    'service_name': 10.0,
+    'provider_name': 5.0,
+    'location_area': 3.0,
+    'description': 1.0,
+}
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def fts5_available(conn=None):
+    """True if the connection is SQLite built with FTS5"""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+        except OperationalError:
+            return False
+    return True
+
+
+def create_fts_table(conn):
+    """Create the FTS5 table used by FTS5SearchBackend"""
+    columns = ', '.join(SEARCH_FIELDS)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_fts_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fts_table_exists(conn=None):
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in conn.introspection.table_names()
+
+
+class FTS5SearchBackend:
+    """Search backed by an SQLite FTS5 table, ranked by weighted bm25"""
+
+    name = 'fts5'
+
+    def _match_expression(self, query, fields):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Quote every token so user input can never be parsed as FTS syntax,
+        # and prefix-match so partial words behave like the old icontains.
+        terms = ' '.join(f'"{token}"*' for token in tokens)
+        return '{%s} : (%s)' % (' '.join(fields), terms)
+
+    def search(self, queryset, query, fields=SEARCH_FIELDS):
+        match = self._match_expression(query, fields)
+        if match is None:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in SEARCH_FIELDS)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank', '-created_at')
+
+    def index(self, service):
+        values = [getattr(service, field) or '' for field in SEARCH_FIELDS]
+        placeholders = ', '.join(['%s'] * len(SEARCH_FIELDS))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [service.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, {placeholders})",
+                [service.pk, *values],
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+    def reindex(self, pks):
+        """Re-read the given listings, e.g. after ``bulk_create``"""
+        from .models import ServiceListing
+
+        columns = ', '.join(SEARCH_FIELDS)
+        table = ServiceListing._meta.db_table
+        pks = list(pks)
+        with connection.cursor() as cursor:
+            for start in range(0, len(pks), REINDEX_CHUNK_SIZE):
+                chunk = pks[start:start + REINDEX_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table} WHERE id IN ({placeholders})',
+                    chunk,
+                )
+
+    def rebuild(self):
+        from .models import ServiceListing
+
+        columns = ', '.join(SEARCH_FIELDS)
+        table = ServiceListing._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table}')
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+class RefreshingIndex:
+    """Base for the in-process indexes: built once, then refreshed off the request path.
+
+    The first lookup builds the index (unless a warm-up already did). Once it
+    is older than ``ttl`` seconds, lookups keep using it and a rebuild runs on
+    a background thread; writes made meanwhile are replayed onto the rebuilt
+    data before it is swapped in. Subclasses provide ``_build()``, which
+    reads the database into a new state without touching the current one,
+    and ``_install(state)``.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._built_at = None
+        # Writes to replay after the running rebuild; None when none is running
+        self._journal = None
+
+    def _ensure_built(self):
+        if self._built_at is None:
+            self.rebuild()
+        elif time.monotonic() - self._built_at > self.ttl:
+            self.rebuild_in_background()
+
+    def rebuild(self):
+        with self._lock:
+            if self._journal is None:
+                self._journal = []
+        try:
+            state = self._build()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            self._install(state)
+            for change in self._journal:
+                change()
+            self._journal = None
+            self._built_at = time.monotonic()
+
+    def rebuild_in_background(self):
+        with self._lock:
+            if self._journal is not None:
+                return
+            self._journal = []
+        threading.Thread(target=self._background_rebuild, name=f'{type(self).__name__}-rebuild', daemon=True).start()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except DatabaseError:
+            logger.exception('Rebuilding %s failed; keeping the current data', type(self).__name__)
+        finally:
+            connections.close_all()
+
+    def _apply(self, change):
+        """Run ``change`` on the current data and again on the data being rebuilt"""
+        with self._lock:
+            if self._built_at is not None:
+                change()
+            if self._journal is not None:
+                self._journal.append(change)
+
+
+class InvertedIndexSearchBackend(RefreshingIndex):
+    """In-process inverted index with prefix matching.
+
+    Postings are kept per field as ``token -> {pk: term_frequency}``; a
+    sorted token list supports prefix lookups with ``bisect``. At most
+    ``max_results`` listings are returned, counted after the queryset's
+    own filters so a narrow search never loses matches to the cap.
+    """
+
+    name = 'inverted'
+
+    # Ranked ids checked against the queryset per query
+    FILTER_CHUNK_SIZE = 1000
+
+    def __init__(self, ttl=None, max_results=1000):
+        super().__init__(ttl if ttl is not None else getattr(settings, 'SEARCH_INDEX_TTL', 300))
+        self.max_results = max_results
+        self._postings = {field: defaultdict(dict) for field in SEARCH_FIELDS}
+        self._documents = {}
+        # Each field's vocabulary in order, for prefix lookups; kept in step
+        # with the postings by _add and _discard
+        self._sorted_tokens = {field: [] for field in SEARCH_FIELDS}
+
+    def _build(self):
+        from .models import ServiceListing
+
+        state = InvertedIndexSearchBackend(ttl=self.ttl)
+        # Sorted once at the end rather than kept in order token by token
+        state._sorted_tokens = None
+        rows = ServiceListing.objects.values_list('pk', *SEARCH_FIELDS)
+        for pk, *values in rows.iterator(chunk_size=2000):
+            state._add(pk, dict(zip(SEARCH_FIELDS, values)))
+        state._sorted_tokens = {field: sorted(state._postings[field]) for field in SEARCH_FIELDS}
+        return state
+
+    def _install(self, state):
+        self._postings = state._postings
+        self._documents = state._documents
+        self._sorted_tokens = state._sorted_tokens
+
+    def _add(self, pk, values):
+        tokens_by_field = {}
+        for field in SEARCH_FIELDS:
+            counts = defaultdict(int)
+            for token in tokenize(values.get(field)):
+                counts[token] += 1
+            postings = self._postings[field]
+            for token, count in counts.items():
+                if token not in postings and self._sorted_tokens is not None:
+                    insort(self._sorted_tokens[field], token)
+                postings[token][pk] = count
+            tokens_by_field[field] = list(counts)
+        self._documents[pk] = tokens_by_field
+
+    def _discard(self, pk):
+        tokens_by_field = self._documents.pop(pk, None)
+        if tokens_by_field is None:
+            return
+        for field, tokens in tokens_by_field.items():
+            postings = self._postings[field]
+            for token in tokens:
+                postings[token].pop(pk, None)
+                if not postings[token]:
+                    del postings[token]
+                    tokens_in_order = self._sorted_tokens[field]
+                    del tokens_in_order[bisect_left(tokens_in_order, token)]
+
+    def index(self, service):
+        values = {field: getattr(service, field) for field in SEARCH_FIELDS}
+
+        def change():
+            self._discard(service.pk)
+            self._add(service.pk, values)
+        self._apply(change)
+
+    def remove(self, pk):
+        self._apply(lambda: self._discard(pk))
+
+    def reindex(self, pks):
+        """Re-read the given listings, e.g. after ``bulk_create``"""
+        from .models import ServiceListing
+
+        if self._built_at is None and self._journal is None:
+            return
+        pks = list(pks)
+        rows = []
+        for start in range(0, len(pks), REINDEX_CHUNK_SIZE):
+            chunk = ServiceListing.objects.filter(pk__in=pks[start:start + REINDEX_CHUNK_SIZE])
+            rows.extend((pk, dict(zip(SEARCH_FIELDS, values))) for pk, *values in chunk.values_list('pk', *SEARCH_FIELDS))
+
+        def change():
+            for pk in pks:
+                self._discard(pk)
+            for pk, values in rows:
+                self._add(pk, values)
+        self._apply(change)
+
+    def _tokens_with_prefix(self, field, prefix):
+        tokens = self._sorted_tokens[field]
+        start = bisect_left(tokens, prefix)
+        end = start
+        while end < len(tokens) and tokens[end].startswith(prefix):
+            end += 1
+        return tokens[start:end]
+
+    def rank(self, query, fields=SEARCH_FIELDS):
+        """Return every ``pk`` matching all query tokens, best first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            self._ensure_built()
+            scores = None
+            for query_token in tokens:
+                token_scores = defaultdict(float)
+                for field in fields:
+                    weight = FIELD_WEIGHTS[field]
+                    postings = self._postings[field]
+                    for token in self._tokens_with_prefix(field, query_token):
+                        exact = 1.0 if token == query_token else 0.5
+                        for pk, count in postings[token].items():
+                            token_scores[pk] += weight * exact * count
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: score + token_scores[pk] for pk, score in scores.items() if pk in token_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [pk for pk, _ in ranked]
+
+    def search(self, queryset, query, fields=SEARCH_FIELDS):
+        # Keep the best matches that pass the queryset's filters, checking
+        # the ranked ids a chunk at a time
+        ranked = []
+        matches = self.rank(query, fields)
+        for start in range(0, len(matches), self.FILTER_CHUNK_SIZE):
+            chunk = matches[start:start + self.FILTER_CHUNK_SIZE]
+            allowed = set(queryset.filter(pk__in=chunk).values_list('pk', flat=True))
+            ranked.extend(pk for pk in chunk if pk in allowed)
+            if len(ranked) >= self.max_results:
+                break
+        ranked = ranked[:self.max_results]
+        if not ranked:
+            return queryset.none()
+        ordering = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ranked)],
+                        output_field=IntegerField())
+        return queryset.filter(pk__in=ranked).annotate(search_rank=ordering).order_by('search_rank')
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Return the configured search backend, falling back to the inverted index"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = getattr(settings, 'SEARCH_BACKEND', 'auto')
+                use_fts = choice in ('auto', 'fts5')
+                if use_fts:
+                    try:
+                        use_fts = fts_table_exists()
+                    except (OperationalError, ProgrammingError):
+                        use_fts = False
+                _backend = FTS5SearchBackend() if use_fts else InvertedIndexSearchBackend()
+    return _backend
+
+
+def reset_search_backend():
+    """Forget the chosen backend so the next call re-detects it"""
+    global _backend
+    _backend = None
+
+
+def search_services(queryset, query, fields=SEARCH_FIELDS):
+    """Filter ``queryset`` to listings matching ``query``, most relevant first.
+
+    A query without word characters (only punctuation, e.g. "++") has
+    nothing to look up in the index and falls back to a substring match.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    if not tokenize(query):
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(condition)
+    return get_search_backend().search(queryset, query, fields)
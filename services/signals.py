@@ -0,0 +1,135 @@
+from django.core.signals import request_finished
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Place, ServiceListing, Review
+from .cache import invalidate_home, bump_category_generation, flush_stats
+from .geocoding import clear_cache as clear_geocoding_cache
+from .rankings import mark_stale as mark_rankings_stale
+from .search import get_search_backend
+from .suggest import get_suggestion_index
+
+
+def deleted_in_cascade(origin, model):
+    """True if a ``post_delete`` for ``model`` comes from deleting some other object"""
+    if origin is None:
+        return False
+    return not isinstance(origin, model) and getattr(origin, 'model', None) is not model
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_rating_aggregates(sender, instance, origin=None, **kwargs):
+    """Keep the listing's stored rating aggregates in step with its reviews"""
+    if deleted_in_cascade(origin, Review):
+        # The listing (or its category) is being deleted; nothing to update
+        return
+    try:
+        service = instance.service_listing
+    except ServiceListing.DoesNotExist:
+        # Reviews deleted in cascade with their listing
+        return
+    service.refresh_rating_aggregates()
+    mark_rankings_stale([service.category_id])
+
+
+@receiver(post_save, sender=ServiceListing)
+def index_service(sender, instance, raw=False, **kwargs):
+    """Add or refresh the listing in the search index"""
+    if not raw:
+        get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=ServiceListing)
+def unindex_service(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=ServiceListing)
+def index_suggestions(sender, instance, raw=False, **kwargs):
+    """Keep the listing's names and area in the typeahead index (available listings only)"""
+    if not raw:
+        get_suggestion_index().index(instance)
+
+
+@receiver(post_delete, sender=ServiceListing)
+def unindex_suggestions(sender, instance, **kwargs):
+    get_suggestion_index().remove(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category_suggestion(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_suggestion_index().index_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category_suggestion(sender, instance, **kwargs):
+    get_suggestion_index().remove_category(instance.pk)
+
+
+@receiver(post_save, sender=ServiceListing)
+def mark_service_rankings_stale(sender, instance, created, raw=False, **kwargs):
+    """A recategorized or (un)listed listing changes its categories' rankings.
+    
+    Connected before count_saved_service, which records the new state.
+    """
+    before = getattr(instance, 'counted_state', None)
+    if not raw and not created and before != instance.count_state():
+        mark_rankings_stale([before[0] if before else None, instance.category_id])
+
+
+@receiver(pre_save, sender=ServiceListing)
+def load_counted_state(sender, instance, raw=False, **kwargs):
+    """Read the stored state of a listing saved without being loaded first"""
+    if raw or instance.pk is None or getattr(instance, 'counted_state', None) is not None:
+        return
+    if instance.count_state() is not None:
+        instance.counted_state = ServiceListing.objects.filter(pk=instance.pk).values_list(
+            'category_id', 'is_available'
+        ).first()
+
+
+@receiver(post_save, sender=ServiceListing)
+def count_saved_service(sender, instance, created, raw=False, **kwargs):
+    """Move the listing between category counts when it is created, recategorized or (un)listed"""
+    if raw:
+        return
+    current = instance.count_state()
+    before = None if created else getattr(instance, 'counted_state', None)
+    # current is None when category and availability were deferred, and so not saved
+    if current is not None and before != current:
+        Category.apply_listing_change(before, current)
+    instance.counted_state = current
+
+
+@receiver(post_delete, sender=ServiceListing)
+def count_deleted_service(sender, instance, **kwargs):
+    Category.apply_listing_change(getattr(instance, 'counted_state', None) or instance.count_state(), None)
+    mark_rankings_stale([instance.category_id])
+
+
+@receiver(post_save, sender=ServiceListing)
+@receiver(post_delete, sender=ServiceListing)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_home_cache(sender, **kwargs):
+    """Featured cards show listing details and ratings, so drop the cached home context"""
+    invalidate_home()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_caches(sender, **kwargs):
+    """Cards show the category name; a new generation retires every cached card"""
+    invalidate_home()
+    bump_category_generation()
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def invalidate_geocoding_cache(sender, **kwargs):
+    clear_geocoding_cache()
+
+
+# Cache hit/miss tallies are written once per request
+request_finished.connect(flush_stats, dispatch_uid='services.cache.flush_stats')
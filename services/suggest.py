@@ -0,0 +1,344 @@
+"""Typeahead suggestions served from an in-memory prefix index.
+
+Service names, provider names, location areas and category names of
+available listings are kept as one sorted list of ``(key, word, ident)``
+tuples per kind, one per word a label can be completed from ("expert
+plumbing services", "plumbing services", "services"). A lookup bisects to
+the typed prefix; a short run of matching keys is ranked directly, while a
+prefix matching more than ``SCAN_LIMIT`` keys keeps its best labels in a
+per-prefix list that writes update in place. Lookups therefore cost about
+the same for "p" as for "plumbing", and never query the database.
+
+The index is built when the server starts (see ``warm_up``) or on first
+use, kept current by the model signals in this process and, like the search
+index, rebuilt in the background every ``SUGGEST_INDEX_TTL`` seconds to pick
+up writes made by other workers.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .search import RefreshingIndex, tokenize
+
+
+# Suggestion kind -> ServiceListing field it is read from
+LISTING_KINDS = {
+    'service': 'service_name',
+    'provider': 'provider_name',
+    'location': 'location_area',
+}
+KINDS = ('service', 'provider', 'category', 'location')
+
+SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# Labels can be completed from any of their first few words
+MAX_WORD_STARTS = 5
+# Prefixes matching more keys than this keep their top MAX_SUGGEST_LIMIT
+# labels instead of being ranked on every lookup
+SCAN_LIMIT = 64
+
+
+def normalize(text):
+    """Lowercase words joined by single spaces, as stored in the index"""
+    return ' '.join(tokenize(text))
+
+
+class SuggestionIndex(RefreshingIndex):
+    """Sorted prefix keys with per-label weights.
+
+    A label's weight is the number of available listings that carry it
+    (plus one for every existing category), so common labels rank first.
+    Labels are deduplicated on their normalized form per kind.
+
+    ``_top[kind]`` maps a prefix (or ``(key,)`` for the run of keys equal
+    to ``key``) to its best ``(later_word, -weight, label, ident)`` ranks,
+    for every prefix whose run is longer than ``SCAN_LIMIT``. Each list
+    holds the best ``MAX_SUGGEST_LIMIT`` labels, or all of them when there
+    are fewer. A write that leaves a full list unable to tell what follows
+    drops it, and the next lookup rebuilds it from the prefix's children.
+    """
+
+    def __init__(self, ttl=None):
+        super().__init__(ttl if ttl is not None else getattr(settings, 'SUGGEST_INDEX_TTL', 300))
+        self._keys = {kind: [] for kind in KINDS}
+        self._top = {kind: {} for kind in KINDS}
+        self._labels = {}
+        self._weights = Counter()
+        self._documents = {}
+        self._categories = {}
+
+    def _build(self):
+        from .models import Category, ServiceListing
+
+        state = SuggestionIndex(ttl=self.ttl)
+        state._categories = categories = dict(Category.objects.values_list('pk', 'name'))
+        rows = ServiceListing.objects.filter(is_available=True).values_list(
+            'pk', 'category_id', *LISTING_KINDS.values()
+        )
+        labels = state._labels
+        labels.update((('category', pk), name) for pk, name in categories.items())
+        state._weights.update(labels.keys())
+        for pk, category_id, *values in rows.iterator(chunk_size=2000):
+            entries = self._entries(category_id, values, categories)
+            for entry, label in entries:
+                labels.setdefault(entry, label)
+                state._weights[entry] += 1
+            state._documents[pk] = [entry for entry, _ in entries]
+        for entry, label in labels.items():
+            state._keys[entry[0]].extend(self._keys_for(entry, label))
+        for kind, keys in state._keys.items():
+            keys.sort()
+            # Fills _top for every prefix with a long run of keys
+            state._ranked(kind, '', 0, len(keys))
+        return state
+
+    def _install(self, state):
+        self._keys = state._keys
+        self._top = state._top
+        self._labels = state._labels
+        self._weights = state._weights
+        self._documents = state._documents
+        self._categories = state._categories
+
+    @staticmethod
+    def _entries(category_id, values, categories):
+        """``((kind, ident), label)`` pairs for one listing"""
+        entries = []
+        if category_id in categories:
+            entries.append((('category', category_id), categories[category_id]))
+        for kind, value in zip(LISTING_KINDS, values):
+            key = normalize(value)
+            if key:
+                entries.append(((kind, key), value.strip()))
+        return entries
+
+    @staticmethod
+    def _keys_for(entry, label):
+        _, ident = entry
+        words = normalize(label).split(' ')
+        return [(' '.join(words[start:]), start, ident)
+                for start in range(min(len(words), MAX_WORD_STARTS)) if words[start]]
+
+    def _scan(self, kind, lo, hi):
+        """Ranks of ``keys[lo:hi]``: later-word matches last, then heavier and alphabetical labels first"""
+        weights, labels = self._weights, self._labels
+        return [(start > 0, -weights[kind, ident], labels[kind, ident].lower(), ident)
+                for _, start, ident in self._keys[kind][lo:hi]]
+
+    @staticmethod
+    def _best(ranks):
+        """The best rank of each of the top MAX_SUGGEST_LIMIT labels, in order"""
+        # A label has at most MAX_WORD_STARTS keys, so its best one is
+        # within this many of the smallest
+        ranked = heapq.nsmallest(MAX_SUGGEST_LIMIT * MAX_WORD_STARTS, ranks)
+        best = {}
+        for rank in ranked:
+            best.setdefault(rank[-1], rank)
+        return list(best.values())[:MAX_SUGGEST_LIMIT]
+
+    @staticmethod
+    def _children(keys, prefix, lo, hi):
+        """Split ``keys[lo:hi]``, which all start with ``prefix``, into runs one character longer.
+
+        Keys equal to the prefix sort first and form a run of their own,
+        named ``(prefix,)``.
+        """
+        if keys[lo][0] == prefix:
+            end = bisect_left(keys, (prefix + '\0',), lo, hi)
+            yield (prefix,), lo, end
+            lo = end
+        depth = len(prefix) + 1
+        while lo < hi:
+            child = keys[lo][0][:depth]
+            end = bisect_left(keys, (child[:-1] + chr(ord(child[-1]) + 1),), lo, hi)
+            yield child, lo, end
+            lo = end
+
+    def _ranked(self, kind, node, lo, hi):
+        """Best ranks among ``keys[lo:hi]``, the run of keys under ``node``"""
+        if hi - lo <= SCAN_LIMIT:
+            return self._best(self._scan(kind, lo, hi))
+        top = self._top[kind].get(node)
+        if top is None:
+            if isinstance(node, tuple):
+                ranks = self._scan(kind, lo, hi)
+            else:
+                ranks = [rank for child, start, end in self._children(self._keys[kind], node, lo, hi)
+                         for rank in self._ranked(kind, child, start, end)]
+            top = self._top[kind][node] = self._best(ranks)
+        return top
+
+    def _rerank(self, entry, keys, removed=False):
+        """Bring the ``_top`` lists of every prefix of ``keys`` in line with the entry's rank"""
+        kind, ident = entry
+        tops = self._top[kind]
+        later_word = {}
+        for key, start, _ in keys:
+            for node in ((key,), *(key[:length] for length in range(len(key) + 1))):
+                later_word[node] = later_word.get(node, True) and start > 0
+        for node, later in later_word.items():
+            top = tops.get(node)
+            if top is None:
+                continue
+            rank = None if removed else (later, -self._weights[entry], self._labels[entry].lower(), ident)
+            complete = len(top) < MAX_SUGGEST_LIMIT
+            position = next((i for i, other in enumerate(top) if other[-1] == ident), None)
+            if position is None:
+                if rank is not None and (complete or rank < top[-1]):
+                    insort(top, rank)
+                    del top[MAX_SUGGEST_LIMIT:]
+                continue
+            previous = top.pop(position)
+            if rank is None:
+                if not complete:
+                    del tops[node]
+            elif complete or rank <= previous or rank < top[-1]:
+                insort(top, rank)
+            else:
+                # Some label outside the list may now rank higher
+                del tops[node]
+
+    def _insert_keys(self, entry, label):
+        keys = self._keys_for(entry, label)
+        for key in keys:
+            insort(self._keys[entry[0]], key)
+        self._rerank(entry, keys)
+
+    def _delete_keys(self, entry, label):
+        keys = self._keys_for(entry, label)
+        kind_keys = self._keys[entry[0]]
+        for key in keys:
+            position = bisect_left(kind_keys, key)
+            if position < len(kind_keys) and kind_keys[position] == key:
+                del kind_keys[position]
+        self._rerank(entry, keys, removed=True)
+
+    def _retain(self, entry, label):
+        self._weights[entry] += 1
+        if self._weights[entry] == 1:
+            self._labels[entry] = label
+            self._insert_keys(entry, label)
+        else:
+            self._rerank(entry, self._keys_for(entry, self._labels[entry]))
+
+    def _release(self, entry):
+        if entry not in self._labels:
+            return
+        self._weights[entry] -= 1
+        if self._weights[entry] <= 0:
+            del self._weights[entry]
+            self._delete_keys(entry, self._labels.pop(entry))
+        else:
+            self._rerank(entry, self._keys_for(entry, self._labels[entry]))
+
+    def _discard(self, pk):
+        for entry in self._documents.pop(pk, ()):
+            self._release(entry)
+
+    def _add(self, pk, category_id, values):
+        entries = self._entries(category_id, values, self._categories)
+        for entry, label in entries:
+            self._retain(entry, label)
+        self._documents[pk] = [entry for entry, _ in entries]
+
+    def index(self, service):
+        pk, category_id, available = service.pk, service.category_id, service.is_available
+        values = [getattr(service, field) for field in LISTING_KINDS.values()]
+
+        def change():
+            self._discard(pk)
+            if available:
+                self._add(pk, category_id, values)
+        self._apply(change)
+
+    def remove(self, pk):
+        self._apply(lambda: self._discard(pk))
+
+    def reindex(self, pks):
+        """Re-read the given listings, e.g. after a bulk ``UPDATE``"""
+        from .models import ServiceListing
+
+        if self._built_at is None and self._journal is None:
+            return
+        rows = list(ServiceListing.objects.filter(pk__in=pks, is_available=True).values_list(
+            'pk', 'category_id', *LISTING_KINDS.values()
+        ))
+
+        def change():
+            for pk in pks:
+                self._discard(pk)
+            for pk, category_id, *values in rows:
+                self._add(pk, category_id, values)
+        self._apply(change)
+
+    def index_category(self, category):
+        """Add a category or follow its rename"""
+        pk, name = category.pk, category.name
+
+        def change():
+            entry = ('category', pk)
+            if pk not in self._categories:
+                self._retain(entry, name)
+            elif self._labels.get(entry, name) != name:
+                self._delete_keys(entry, self._labels[entry])
+                self._labels[entry] = name
+                self._insert_keys(entry, name)
+            self._categories[pk] = name
+        self._apply(change)
+
+    def remove_category(self, pk):
+        def change():
+            if self._categories.pop(pk, None) is not None:
+                # Drops the category's own weight; its listings release theirs
+                self._release(('category', pk))
+        self._apply(change)
+
+    def suggest(self, query, limit=SUGGEST_LIMIT, kinds=KINDS):
+        """Up to ``limit`` (at most ``MAX_SUGGEST_LIMIT``) suggestions for a typed prefix.
+
+        Labels that start with the prefix come before labels with a later
+        word matching it; then heavier labels first, then alphabetical.
+        """
+        prefix = normalize(query)
+        if not prefix or limit <= 0:
+            return []
+        self._ensure_built()
+        with self._lock:
+            ranked = []
+            for kind in kinds:
+                keys = self._keys[kind]
+                start = bisect_left(keys, (prefix,))
+                # Every key starting with the prefix sorts before its successor
+                end = bisect_left(keys, (prefix[:-1] + chr(ord(prefix[-1]) + 1),), start)
+                if start < end:
+                    ranked.extend((*rank[:-1], kind, rank[-1]) for rank in self._ranked(kind, prefix, start, end))
+            entries = [(kind, ident) for *_, kind, ident in sorted(ranked)[:limit]]
+            return [
+                {'kind': kind, 'label': self._labels[(kind, ident)], 'id': ident if kind == 'category' else None}
+                for kind, ident in entries
+            ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggestion_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SuggestionIndex()
+    return _index
+
+
+def warm_up():
+    """Build the index before the first request; skipped if the tables are missing"""
+    try:
+        get_suggestion_index().rebuild()
+    except DatabaseError:
+        pass
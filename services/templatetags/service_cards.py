@@ -0,0 +1,14 @@
+from django import template
+from services.cache import category_generation, render_card
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def service_card(context, service, template_name='services/service_card.html'):
+    """Render a (cached) service card; nearest-sorted listings also show their distance"""
+    # Read once per page rather than once per card
+    generation = context.render_context.get('services:category_generation')
+    if generation is None:
+        generation = context.render_context['services:category_generation'] = category_generation()
+    return render_card(service, template_name, getattr(service, 'distance', None), generation)
@@ -0,0 +1,732 @@
+import random
+from datetime import timedelta
+from math import asin, cos, radians, sin, sqrt
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from services.cache import bump_gazetteer_generation, flush_stats, render_card, stats
+from services import geo
+from services.checks import check_review_queue
+from services.geocoding import geocode
+from services.models import Category, PendingReview, Place, Review, ServiceListing, ServiceOwner, ServiceRanking
+from services.ownership import LEGACY_SESSION_KEY
+from services.pagination import KEYSET_ORDERING, PAGE_NUMBER_LIMIT, KeysetPaginator, estimated_row_count, paginate
+from services.rankings import RankedResults, prior_mean, ranked_services, refresh_rankings
+from services.review_queue import apply_pending_reviews
+from services.search import (
+    SEARCH_FIELDS, FTS5SearchBackend, InvertedIndexSearchBackend, fts_table_exists, reset_search_backend,
+    search_services,
+)
+from services.suggest import MAX_SUGGEST_LIMIT, SuggestionIndex
+
+
+def make_listing(category, **fields):
+    values = {
+        'service_name': 'Service',
+        'provider_name': 'Provider',
+        'contact_info': 'Contact: +91-9876543210',
+        'description': 'Local service',
+        'location_area': 'Pune Central',
+    }
+    values.update(fields)
+    return ServiceListing.objects.create(category=category, **values)
+
+
+def icontains_baseline(queryset, query, fields=SEARCH_FIELDS):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(condition)
+
+
+class SearchTests(TestCase):
+    QUERIES = ['tutor', 'plumb', 'pune', 'rao', 'garden', 'mumbai', 'nothingmatches']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutoring = Category.objects.create(name='Tutoring')
+        cls.repair = Category.objects.create(name='Home Repair')
+        rows = [
+            (cls.tutoring, 'Math Tutoring', 'Asha Rao', 'Pune Central'),
+            (cls.tutoring, 'Science Tutoring', 'Vikram Singh', 'Mumbai West'),
+            (cls.tutoring, 'Guitar Lessons', 'Neha Rao', 'Pune East'),
+            (cls.repair, 'Pipe Plumbing', 'Ravi Kumar', 'Mumbai Central'),
+            (cls.repair, 'Garden Care', 'Priya Patel', 'Delhi North'),
+            (cls.repair, 'Plumbing Repairs', 'Amit Sharma', 'Pune Station Road'),
+        ]
+        for category, service_name, provider_name, location_area in rows:
+            make_listing(category, service_name=service_name, provider_name=provider_name,
+                         location_area=location_area, description=f'{service_name} by {provider_name}')
+
+    def setUp(self):
+        reset_search_backend()
+
+    def backends(self):
+        inverted = InvertedIndexSearchBackend()
+        inverted.rebuild()
+        backends = [inverted]
+        if fts_table_exists():
+            fts = FTS5SearchBackend()
+            fts.rebuild()
+            backends.append(fts)
+        return backends
+
+    def test_results_match_icontains_baseline(self):
+        services = ServiceListing.objects.all()
+        for backend in self.backends():
+            for query in self.QUERIES:
+                with self.subTest(backend=backend.name, query=query):
+                    self.assertEqual(
+                        set(backend.search(services, query).values_list('pk', flat=True)),
+                        set(icontains_baseline(services, query).values_list('pk', flat=True)),
+                    )
+
+    def test_filters_apply_before_result_cap(self):
+        backend = InvertedIndexSearchBackend(max_results=1)
+        backend.FILTER_CHUNK_SIZE = 2
+        backend.rebuild()
+        # "pune" ranks several listings; the category filter keeps only later ones
+        services = ServiceListing.objects.filter(category=self.repair)
+        self.assertEqual(
+            list(backend.search(services, 'pune').values_list('service_name', flat=True)),
+            ['Plumbing Repairs'],
+        )
+
+    def test_punctuation_only_query_falls_back_to_substring_match(self):
+        services = ServiceListing.objects.all()
+        self.assertFalse(search_services(services, '++').exists())
+        listing = make_listing(self.repair, service_name='C++ Coaching')
+        self.assertEqual(list(search_services(services, '++')), [listing])
+
+    def test_writes_keep_the_vocabulary_sorted(self):
+        backend = InvertedIndexSearchBackend()
+        backend.rebuild()
+        listing = ServiceListing.objects.get(service_name='Garden Care')
+        listing.service_name = listing.description = 'Aardvark Removal'
+        backend.index(listing)
+        backend.remove(ServiceListing.objects.get(service_name='Guitar Lessons').pk)
+        for field in SEARCH_FIELDS:
+            self.assertEqual(backend._sorted_tokens[field], sorted(backend._postings[field]))
+        self.assertEqual(backend.rank('aard'), [listing.pk])
+        self.assertEqual(backend.rank('guitar'), [])
+        self.assertEqual(backend.rank('garden'), [])
+
+    def test_writes_during_rebuild_are_replayed(self):
+        backend = InvertedIndexSearchBackend()
+        backend.rebuild()
+        listing = ServiceListing.objects.get(service_name='Garden Care')
+        build = backend._build
+
+        def build_with_concurrent_write():
+            state = build()
+            listing.service_name = 'Lawn Mowing'
+            backend.index(listing)
+            return state
+        backend._build = build_with_concurrent_write
+        backend.rebuild()
+        self.assertEqual(backend.rank('lawn'), [listing.pk])
+
+    def test_reindex_picks_up_bulk_created_listings(self):
+        backends = self.backends()
+        created = ServiceListing.objects.bulk_create([
+            ServiceListing(category=self.repair, service_name=f'Roof Welding {i}', provider_name='Provider',
+                           contact_info='Contact: +91-9876543210', description='Local service',
+                           location_area='Nagpur')
+            for i in range(3)
+        ])
+        services = ServiceListing.objects.all()
+        for backend in backends:
+            with self.subTest(backend=backend.name):
+                self.assertFalse(backend.search(services, 'welding').exists())
+                backend.reindex([listing.pk for listing in created])
+                self.assertEqual(
+                    set(backend.search(services, 'welding').values_list('pk', flat=True)),
+                    {listing.pk for listing in created},
+                )
+                self.assertEqual(
+                    set(backend.search(services, 'pune').values_list('pk', flat=True)),
+                    set(icontains_baseline(services, 'pune').values_list('pk', flat=True)),
+                )
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Cleaning')
+        now = timezone.now()
+        for i in range(23):
+            listing = make_listing(category, service_name=f'Cleaner {i}')
+            # Groups of three share a timestamp, so pages split ties on id
+            ServiceListing.objects.filter(pk=listing.pk).update(created_at=now - timedelta(minutes=i // 3))
+        cls.expected = list(ServiceListing.objects.order_by(*KEYSET_ORDERING).values_list('pk', flat=True))
+
+    def test_pages_have_no_gaps_or_duplicates(self):
+        paginator = KeysetPaginator(ServiceListing.objects.all(), 5)
+        pages = [paginator.page(None)]
+        while pages[-1].next_cursor:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([service.pk for page in pages for service in page], self.expected)
+
+        # Walking back from the last page retraces the same pages
+        page = pages[-1]
+        for previous in reversed(pages[:-1]):
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual([service.pk for service in page], [service.pk for service in previous])
+        self.assertIsNone(page.previous_cursor)
+
+    def test_deep_page_numbers_are_served_by_cursor(self):
+        request = RequestFactory().get('/services/', {'page': '50'})
+        page = paginate(request, ServiceListing.objects.all(), 2)
+        self.assertEqual(page.number, PAGE_NUMBER_LIMIT)
+        self.assertFalse(page.has_last_link)
+        self.assertIsNotNone(page.next_cursor)
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads sqlite_stat1')
+    def test_estimated_row_count_ignores_partial_indexes(self):
+        # The is_available partial indexes only cover a few rows
+        ServiceListing.objects.exclude(pk__in=self.expected[:3]).update(is_available=False)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # Put the partial index rows first, where a LIMIT 1 would find them
+            cursor.execute('SELECT tbl, idx, stat FROM sqlite_stat1')
+            rows = sorted(cursor.fetchall(), key=lambda row: int(row[2].split()[0]))
+            cursor.execute('DELETE FROM sqlite_stat1')
+            cursor.executemany('INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (%s, %s, %s)', rows)
+            self.assertIn(3, {int(stat.split()[0]) for tbl, idx, stat in rows if tbl == ServiceListing._meta.db_table})
+        self.assertEqual(estimated_row_count(ServiceListing), 23)
+
+
+class ServiceListApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Tutoring')
+        cls.listing = make_listing(cls.category, service_name='Math Tutoring')
+
+    def test_unchanged_list_answers_304(self):
+        url = reverse('api_service_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.category.name = 'Private Tutoring'
+        self.category.save()
+        renamed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()['results'][0]['category'], 'Private Tutoring')
+
+    def test_detail_etag_follows_category_renames(self):
+        url = reverse('api_service_detail', args=[self.listing.pk])
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.category.name = 'Private Tutoring'
+        self.category.save()
+        renamed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()['category'], 'Private Tutoring')
+
+    def test_invalid_filters_answer_400(self):
+        url = reverse('api_service_list')
+        for params in ({'category': 'abc'}, {'radius': '-1'}, {'radius': 'far'},
+                       {'user_lat': '91', 'user_lng': '0'}, {'user_lat': '0', 'user_lng': 'east'},
+                       {'user_lat': 'inf', 'user_lng': '0'}, {'user_lat': 'nan', 'user_lng': '0'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class ServiceListTests(TestCase):
+    def test_invalid_origin_is_ignored(self):
+        listing = make_listing(Category.objects.create(name='Tutoring'), latitude=18.52, longitude=73.85)
+        for lat in ('inf', '-inf', 'nan', '91'):
+            with self.subTest(lat=lat):
+                response = self.client.get(reverse('service_list'), {'user_lat': lat, 'user_lng': '0', 'sort': 'nearest'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['page_obj']), [listing])
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    h = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return 2 * geo.EARTH_RADIUS_KM * asin(sqrt(h))
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class GeoTests(TestCase):
+    """Geo lookups against a brute-force haversine over every listing"""
+
+    ORIGINS = [(18.52, 73.85), (19.07, 72.88), (28.61, 77.21), (-33.87, 151.21)]
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Tutoring')
+        rng = random.Random(7)
+        # Mostly clustered around Pune, with a spread across India and a
+        # few on other continents so the search box has to keep growing
+        points = [(18.52 + rng.uniform(-0.3, 0.3), 73.85 + rng.uniform(-0.3, 0.3)) for _ in range(25)]
+        points += [(rng.uniform(8, 32), rng.uniform(68, 90)) for _ in range(15)]
+        points += [(51.5, -0.13), (40.71, -74.0), (-33.9, 151.2)]
+        for i, (lat, lng) in enumerate(points):
+            make_listing(category, service_name=f'Located {i}', latitude=lat, longitude=lng)
+        for i in range(3):
+            make_listing(category, service_name=f'Unlocated {i}', location_area='Nowhere In Particular')
+        cls.located = list(ServiceListing.objects.exclude(geohash='').order_by('pk').values_list('pk', 'latitude', 'longitude'))
+        cls.unlocated = list(ServiceListing.objects.filter(geohash='').values_list('pk', flat=True))
+
+    def implementations(self):
+        """Patch ``geo.numpy`` to run each test on both code paths"""
+        yield 'array', mock.patch.object(geo, 'numpy', None)
+        if numpy is not None:
+            yield 'numpy', mock.patch.object(geo, 'numpy', numpy)
+
+    def brute_force(self, lat, lng):
+        return sorted((haversine(lat, lng, point_lat, point_lng), pk) for pk, point_lat, point_lng in self.located)
+
+    def test_fixture_is_mixed(self):
+        self.assertEqual(len(self.located), 43)
+        self.assertEqual(len(self.unlocated), 3)
+
+    def test_nearest_matches_brute_force(self):
+        services = ServiceListing.objects.all()
+        for name, patch in self.implementations():
+            with patch:
+                for origin in self.ORIGINS:
+                    expected = self.brute_force(*origin)
+                    for limit in (1, 5, 30, 100):
+                        with self.subTest(impl=name, origin=origin, limit=limit):
+                            results = geo.nearest(services, *origin, limit)
+                            self.assertEqual([service.pk for service in results], [pk for _, pk in expected[:limit]])
+                            for service, (distance, _) in zip(results, expected):
+                                self.assertAlmostEqual(service.distance, distance, delta=0.01)
+
+    def test_batch_distances_match_haversine(self):
+        rows = ServiceListing.objects.exclude(geohash='').values_list('lat_sin', 'lat_cos', 'lng_sin', 'lng_cos')
+        expected = [haversine(18.52, 73.85, lat, lng) for _, lat, lng in self.located]
+        for name, patch in self.implementations():
+            with patch, self.subTest(impl=name):
+                distances = geo.batch_distances(18.52, 73.85, *geo._columns(rows.order_by('pk'), 4))
+                self.assertEqual(len(distances), len(expected))
+                for distance, reference in zip(distances, expected):
+                    # acos loses a little precision for nearby points
+                    self.assertAlmostEqual(distance, reference, delta=1e-3)
+
+    def test_within_radius_matches_brute_force(self):
+        services = ServiceListing.objects.all()
+        for origin in self.ORIGINS:
+            expected = self.brute_force(*origin)
+            for radius in (1, 10, 50, 500, 5000):
+                with self.subTest(origin=origin, radius=radius):
+                    results = geo.within_radius(services, *origin, radius)
+                    self.assertEqual(
+                        set(results.values_list('pk', flat=True)),
+                        {pk for distance, pk in expected if distance <= radius},
+                    )
+                    for service in results:
+                        self.assertAlmostEqual(service.distance, haversine(origin[0], origin[1], service.latitude,
+                                                                           service.longitude), delta=0.01)
+
+    def test_nearest_results_slices_like_a_list(self):
+        services = ServiceListing.objects.order_by('-created_at', '-id')
+        expected = [pk for _, pk in self.brute_force(18.52, 73.85)]
+        expected += list(services.filter(geohash='').values_list('pk', flat=True))
+        for name, patch in self.implementations():
+            with patch:
+                results = geo.NearestResults(services, 18.52, 73.85)
+                self.assertEqual(results.count(), len(expected))
+                for start, stop in [(0, 10), (10, 20), (38, 46), (40, 44), (44, 100), (5, 5), (0, None)]:
+                    with self.subTest(impl=name, start=start, stop=stop):
+                        self.assertEqual([service.pk for service in results[start:stop]], expected[start:stop])
+                self.assertEqual(results[7].pk, expected[7])
+                self.assertIsNone(results[len(expected) - 1].distance)
+                with self.assertRaises(IndexError):
+                    results[len(expected)]
+
+    def test_top_k_breaks_ties_by_key_and_respects_max_distance(self):
+        rng = random.Random(3)
+        distances = [float(rng.randint(0, 20)) for _ in range(200)]
+        keys = list(range(200))
+        rng.shuffle(keys)
+        pairs = sorted(zip(distances, keys))
+        for name, patch in self.implementations():
+            with patch:
+                for k in (0, 1, 7, 50, 500):
+                    for max_distance in (None, 0.0, 5.0, 19.5):
+                        with self.subTest(impl=name, k=k, max_distance=max_distance):
+                            expected = [pair for pair in pairs if max_distance is None or pair[0] <= max_distance][:k]
+                            self.assertEqual(geo.top_k(distances, keys, k, max_distance), expected)
+
+    @skipUnless(numpy, 'NumPy is not installed')
+    def test_numpy_and_array_paths_agree(self):
+        services = ServiceListing.objects.all()
+        results = {}
+        for name, patch in self.implementations():
+            with patch:
+                results[name] = [(service.pk, service.distance) for service in geo.nearest(services, 18.52, 73.85, 20)]
+        self.assertEqual(results['numpy'], results['array'])
+
+
+class GeocodingTests(TestCase):
+    def test_gazetteer_changes_elsewhere_reach_this_process(self):
+        self.assertIsNone(geocode('Shop 4, Quietvale'))
+        # bulk_create sends no signals, so this process keeps its cached miss
+        Place.objects.bulk_create([Place(name='quietvale', display_name='Quietvale', latitude=12.5, longitude=76.5)])
+        self.assertIsNone(geocode('Shop 4, Quietvale'))
+        # What clear_cache() in the writing process does to the shared cache
+        bump_gazetteer_generation()
+        self.assertEqual(geocode('Shop 4, Quietvale'), (12.5, 76.5))
+
+
+class ClusterApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutoring = Category.objects.create(name='Tutoring')
+        cls.repair = Category.objects.create(name='Home Repair')
+        points = [(cls.tutoring, 18.52, 73.85), (cls.tutoring, 18.53, 73.86), (cls.repair, 18.51, 73.84),
+                  (cls.tutoring, 28.61, 77.21), (cls.repair, -17.7, 178.1), (cls.repair, -17.8, -179.9)]
+        for category, lat, lng in points:
+            make_listing(category, latitude=lat, longitude=lng)
+        make_listing(cls.tutoring, service_name='Hidden', latitude=18.52, longitude=73.85, is_available=False)
+
+    def clusters(self, **params):
+        response = self.client.get(reverse('api_service_clusters'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['clusters']
+
+    def test_clusters_count_available_listings_in_the_box(self):
+        clusters = self.clusters(bbox='60,10,90,30', zoom=5)
+        self.assertEqual(sum(count for _, _, count, _ in clusters), 4)
+        # Zoomed in on Pune, the far-away Delhi listing drops out
+        self.assertEqual(sum(count for _, _, count, _ in self.clusters(bbox='73.5,18.3,74.2,18.7', zoom=12)), 3)
+
+    def test_single_listing_clusters_carry_its_id(self):
+        delhi = ServiceListing.objects.get(latitude=28.61)
+        clusters = self.clusters(bbox='77,28,77.5,29', zoom=14)
+        self.assertEqual(clusters, [[28.61, 77.21, 1, delhi.pk]])
+
+    def test_category_filter_and_antimeridian_box(self):
+        clusters = self.clusters(bbox='60,10,90,30', zoom=5, category=self.repair.pk)
+        self.assertEqual(sum(count for _, _, count, _ in clusters), 1)
+        self.assertEqual(sum(count for _, _, count, _ in self.clusters(bbox='178,-18,-179,-17', zoom=8)), 2)
+
+    def test_invalid_parameters_answer_400(self):
+        url = reverse('api_service_clusters')
+        for params in ({}, {'bbox': '60,10,90'}, {'bbox': '60,30,90,10'}, {'bbox': 'inf,10,90,30'},
+                       {'bbox': '60,10,90,30', 'zoom': 'near'}, {'bbox': '60,10,90,30', 'category': 'abc'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Tutoring')
+        make_listing(category, service_name='Math Tutoring', email='asha@example.com')
+        make_listing(category, service_name='Retired Tutor', is_available=False)
+        cls.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+
+    def test_export_requires_staff(self):
+        response = self.client.get(reverse('export_services'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response['Location'])
+
+    def test_export_streams_available_listings_only(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_services'), {'all': '1'})
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('Math Tutoring', body)
+        self.assertNotIn('Retired Tutor', body)
+
+
+class CategoryCountTests(TestCase):
+    def test_saving_an_unloaded_listing_moves_its_count(self):
+        tutoring = Category.objects.create(name='Tutoring')
+        repair = Category.objects.create(name='Home Repair')
+        listing = make_listing(tutoring)
+        fields = {field.attname: getattr(listing, field.attname) for field in ServiceListing._meta.concrete_fields}
+        ServiceListing(**{**fields, 'category_id': repair.pk}).save()
+
+        counts = dict(Category.objects.values_list('name', 'listing_count'))
+        self.assertEqual(counts, {'Tutoring': 0, 'Home Repair': 1})
+        self.assertEqual(Category.refresh_listing_counts(), 0)
+
+
+class OwnershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Tutoring')
+
+    def create_listing(self, client, name):
+        response = client.post(reverse('create_service'), {
+            'service_name': name,
+            'provider_name': 'Asha Rao',
+            'contact_info': 'Call after 5pm',
+            'description': 'Weekday evening classes',
+            'location_area': 'Pune Central',
+            'category': self.category.pk,
+        })
+        listing = ServiceListing.objects.get(service_name=name)
+        self.assertRedirects(response, reverse('service_detail', args=[listing.pk]))
+        return listing
+
+    def test_creator_can_edit_and_delete(self):
+        first = self.create_listing(self.client, 'Math Tutoring')
+        second = self.create_listing(self.client, 'Science Tutoring')
+        # One owner key in the session covers every listing this browser created
+        self.assertEqual(ServiceOwner.objects.filter(service__in=[first, second]).values('token_hash').distinct().count(), 1)
+
+        self.assertEqual(self.client.get(reverse('update_service', args=[first.pk])).status_code, 200)
+        self.client.post(reverse('delete_service', args=[second.pk]))
+        self.assertFalse(ServiceListing.objects.filter(pk=second.pk).exists())
+        self.assertFalse(ServiceOwner.objects.filter(service_id=second.pk).exists())
+
+    def test_other_browsers_cannot_edit_or_delete(self):
+        listing = self.create_listing(self.client, 'Math Tutoring')
+        other = Client()
+        detail = reverse('service_detail', args=[listing.pk])
+        self.assertRedirects(other.get(reverse('update_service', args=[listing.pk])), detail)
+        self.assertRedirects(other.post(reverse('delete_service', args=[listing.pk])), detail)
+        self.assertTrue(ServiceListing.objects.filter(pk=listing.pk).exists())
+
+        # Another browser that has created a listing of its own is no different
+        self.create_listing(other, 'Guitar Lessons')
+        self.assertRedirects(other.get(reverse('update_service', args=[listing.pk])), detail)
+
+    def test_legacy_session_ownership_is_migrated(self):
+        listing = make_listing(self.category)
+        session = self.client.session
+        session[LEGACY_SESSION_KEY] = {str(listing.pk): True}
+        session.save()
+        self.assertEqual(self.client.get(reverse('update_service', args=[listing.pk])).status_code, 200)
+        self.assertNotIn(LEGACY_SESSION_KEY, self.client.session)
+
+
+@override_settings(REVIEW_INGESTION='queued')
+class ReviewQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.listing = make_listing(Category.objects.create(name='Tutoring'))
+
+    def test_submitted_review_is_queued_then_applied(self):
+        url = reverse('service_detail', args=[self.listing.pk])
+        self.client.post(url, {'reviewer_name': 'Asha', 'rating': 4, 'comment': 'Patient teacher'})
+        self.assertFalse(Review.objects.exists())
+        self.assertContains(self.client.get(url), 'Patient teacher')
+
+        submitted_at = timezone.now() - timedelta(hours=2)
+        PendingReview.objects.update(created_at=submitted_at)
+        PendingReview.objects.create(service_listing=self.listing, reviewer_name='Ravi', rating=2, comment='Late')
+        self.assertEqual(apply_pending_reviews(batch_size=10), 2)
+
+        self.assertFalse(PendingReview.objects.exists())
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.rating_sum, self.listing.rating_count, self.listing.rating_average), (6, 2, 3.0))
+        # Reviews keep the time they were submitted, not the time they were applied
+        self.assertEqual(Review.objects.get(reviewer_name='Asha').created_at, submitted_at)
+        self.assertEqual(list(self.listing.reviews.values_list('reviewer_name', flat=True)), ['Ravi', 'Asha'])
+
+    @override_settings(REVIEW_QUEUE_MAX_AGE=60)
+    def test_check_warns_about_a_backed_up_queue(self):
+        PendingReview.objects.create(service_listing=self.listing, reviewer_name='Asha', rating=4, comment='Good')
+        self.assertEqual(check_review_queue(None, databases=['default']), [])
+        PendingReview.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual([warning.id for warning in check_review_queue(None, databases=['default'])], ['services.W002'])
+
+
+class SuggestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Tutoring')
+        ServiceListing.objects.bulk_create([
+            ServiceListing(category=cls.category, service_name=f'Painting Job {i:04}', provider_name='Provider',
+                           contact_info='Contact', description='Local service', location_area='Pune')
+            for i in range(600)
+        ])
+        for _ in range(3):
+            make_listing(cls.category, service_name='Plumbing')
+
+    def test_popular_labels_win_over_the_whole_prefix_range(self):
+        index = SuggestionIndex()
+        index.rebuild()
+        # 600 one-off labels sort before "plumbing"; it still ranks first on weight
+        suggestions = index.suggest('p', limit=3, kinds=('service',))
+        self.assertEqual(suggestions[0]['label'], 'Plumbing')
+        self.assertEqual(len(suggestions), 3)
+
+    def test_writes_during_rebuild_are_replayed(self):
+        index = SuggestionIndex()
+        index.rebuild()
+        build = index._build
+
+        def build_with_concurrent_write():
+            state = build()
+            index.index(make_listing(self.category, service_name='Yoga Classes'))
+            return state
+        index._build = build_with_concurrent_write
+        index.rebuild()
+        self.assertEqual([s['label'] for s in index.suggest('yoga')], ['Yoga Classes'])
+
+    @mock.patch('services.suggest.SCAN_LIMIT', 4)
+    def test_cached_prefix_rankings_follow_writes(self):
+        index = SuggestionIndex()
+        index.rebuild()
+        self.assertIn('p', index._top['service'])
+        plumbing = list(ServiceListing.objects.filter(service_name='Plumbing'))
+        renamed = ServiceListing.objects.filter(service_name__startswith='Painting Job').first()
+
+        def delete(listing):
+            index.remove(listing.pk)
+            listing.delete()
+
+        def rename(listing, name):
+            listing.service_name = name
+            listing.save()
+            index.index(listing)
+
+        writes = [
+            # A label gains weight, loses it, and disappears
+            lambda: index.index(make_listing(self.category, service_name='Painting Job 0042')),
+            lambda: delete(plumbing[0]),
+            lambda: delete(plumbing[1]) or delete(plumbing[2]),
+            lambda: index.index(make_listing(self.category, service_name='Pottery Painting')),
+            lambda: rename(renamed, 'Jigsaw Painting'),
+        ]
+        for step, write in enumerate(writes):
+            write()
+            fresh = SuggestionIndex()
+            fresh.rebuild()
+            for prefix in ('p', 'pa', 'painting job 00', 'pl', 'j'):
+                with self.subTest(step=step, prefix=prefix):
+                    self.assertEqual(index.suggest(prefix, MAX_SUGGEST_LIMIT), fresh.suggest(prefix, MAX_SUGGEST_LIMIT))
+
+
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutoring = Category.objects.create(name='Tutoring')
+        cls.repair = Category.objects.create(name='Home Repair')
+        cls.one_review = make_listing(cls.tutoring, service_name='One Review')
+        cls.long_record = make_listing(cls.tutoring, service_name='Long Record')
+        cls.average = make_listing(cls.tutoring, service_name='Average')
+        make_listing(cls.tutoring, service_name='Unreviewed')
+        cls.plumber = make_listing(cls.repair, service_name='Plumber')
+        for listing, ratings in ((cls.one_review, [5]), (cls.long_record, [5, 5, 4, 5, 5, 5, 5, 5]),
+                                 (cls.average, [3, 3, 3]), (cls.plumber, [4])):
+            for rating in ratings:
+                Review.objects.create(service_listing=listing, reviewer_name='Reviewer', rating=rating, comment='ok')
+        # Only the long record's reviews fall outside the trending window
+        cls.long_record.reviews.update(created_at=timezone.now() - timedelta(days=30))
+
+    def ranking(self, sort, category=None, services=None):
+        services = services or ServiceListing.objects.filter(is_available=True)
+        if category:
+            services = services.filter(category=category)
+        return [service.service_name for service in ranked_services(services, sort, category and category.pk)[:20]]
+
+    def assert_orders(self):
+        # One five-star review does not outrank a long record of them;
+        # listings outside a ranking follow, newest first
+        self.assertEqual(self.ranking('top_rated', self.tutoring),
+                         ['Long Record', 'One Review', 'Average', 'Unreviewed'])
+        self.assertEqual(self.ranking('trending', self.tutoring),
+                         ['Average', 'One Review', 'Unreviewed', 'Long Record'])
+        self.assertEqual(self.ranking('top_rated'), ['Long Record', 'One Review', 'Plumber', 'Average', 'Unreviewed'])
+
+    def test_live_order_before_the_first_refresh(self):
+        self.assertFalse(ServiceRanking.objects.exists())
+        self.assert_orders()
+
+    def test_refreshed_rankings_keep_the_order(self):
+        refresh_rankings(full=True)
+        self.assertTrue(ServiceRanking.objects.filter(kind='trending', category=self.tutoring).exists())
+        self.assert_orders()
+        response = self.client.get(reverse('category_services', args=[self.tutoring.pk]), {'sort': 'top_rated'})
+        self.assertEqual([service.service_name for service in response.context['page_obj']],
+                         ['Long Record', 'One Review', 'Average', 'Unreviewed'])
+
+    @override_settings(RANKING_SIZE=1)
+    def test_filters_keep_listings_outside_the_ranking(self):
+        refresh_rankings(full=True)
+        services = ServiceListing.objects.filter(is_available=True, service_name__contains='e')
+        self.assertEqual(self.ranking('top_rated', self.tutoring, services),
+                         ['Long Record', 'Unreviewed', 'Average', 'One Review'])
+        results = ranked_services(services.filter(category=self.tutoring), 'top_rated', self.tutoring.pk)
+        self.assertEqual(results.count(), 4)
+        self.assertEqual([service.service_name for service in results[1:3]], ['Unreviewed', 'Average'])
+
+    def test_an_empty_ranking_is_not_computed_live(self):
+        quiet = Category.objects.create(name='Quiet')
+        make_listing(quiet, service_name='No Reviews Yet')
+        refresh_rankings(full=True)
+        self.assertFalse(ServiceRanking.objects.filter(kind='trending', category=quiet).exists())
+        results = ranked_services(ServiceListing.objects.filter(category=quiet), 'trending', quiet.pk)
+        self.assertIsInstance(results, RankedResults)
+        self.assertEqual([service.service_name for service in results[:12]], ['No Reviews Yet'])
+
+    def test_partial_refresh_rescores_every_category_against_one_prior(self):
+        refresh_rankings(full=True)
+        Review.objects.create(service_listing=self.plumber, reviewer_name='Reviewer', rating=1, comment='late')
+        self.assertEqual(list(Category.objects.filter(rankings_stale=True)), [self.repair])
+
+        self.assertEqual(refresh_rankings(), Category.objects.count())
+        priors = set(ServiceRanking.objects.filter(kind='top_rated').values_list('prior_mean', flat=True))
+        self.assertEqual(priors, {prior_mean()})
+        # With an unchanged prior only stale categories are recomputed
+        self.assertEqual(refresh_rankings(), 0)
+
+
+class CardCacheTests(TestCase):
+    TEMPLATE = 'services/service_card.html'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Tutoring')
+        cls.listing = make_listing(cls.category, service_name='Math Tutoring')
+
+    def setUp(self):
+        flush_stats()
+        cache.clear()
+
+    def card_stats(self):
+        flush_stats()
+        return stats()['card']
+
+    def test_distance_is_filled_in_after_the_cache(self):
+        first = render_card(self.listing, self.TEMPLATE, distance=1.5)
+        second = render_card(self.listing, self.TEMPLATE, distance=12.25)
+        self.assertIn('1.5 km away', first)
+        self.assertIn('12.25 km away', second)
+        self.assertNotIn('km away', render_card(self.listing, self.TEMPLATE))
+        # One entry with a distance and one without, whatever the distances
+        self.assertEqual(self.card_stats(), {'hits': 1, 'misses': 2})
+
+    def test_listing_and_category_changes_miss(self):
+        render_card(self.listing, self.TEMPLATE)
+        render_card(self.listing, self.TEMPLATE)
+        self.assertEqual(self.card_stats(), {'hits': 1, 'misses': 1})
+
+        self.listing.service_name = 'Algebra Tutoring'
+        self.listing.save()
+        self.assertIn('Algebra Tutoring', render_card(self.listing, self.TEMPLATE))
+
+        self.category.name = 'Private Tutoring'
+        self.category.save()
+        listing = ServiceListing.objects.select_related('category').get(pk=self.listing.pk)
+        self.assertIn('Private Tutoring', render_card(listing, self.TEMPLATE))
+        self.assertEqual(self.card_stats(), {'hits': 1, 'misses': 3})
@@ -1,12 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, api, async_views
+
+# Under ASGI the read-heavy pages can be served by their async versions
+read_views = async_views if getattr(settings, 'ASYNC_VIEWS', False) else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('services/', views.service_list, name='service_list'),
-    path('services/<int:pk>/', views.service_detail, name='service_detail'),
+    path('', read_views.home, name='home'),
+    path('services/', read_views.service_list, name='service_list'),
+    path('services/<int:pk>/', read_views.service_detail, name='service_detail'),
+    path('services/<int:pk>/reviews/', read_views.service_reviews, name='service_reviews'),
     path('services/create/', views.create_service, name='create_service'),
     path('services/<int:pk>/update/', views.update_service, name='update_service'),
     path('services/<int:pk>/delete/', views.delete_service, name='delete_service'),
-    path('category/<int:category_id>/', views.category_services, name='category_services'),
+    path('category/<int:category_id>/', read_views.category_services, name='category_services'),
+    path('api/services/', api.api_service_list, name='api_service_list'),
+    path('api/services/export/', api.export_services, name='export_services'),
+    path('api/services/clusters/', api.api_service_clusters, name='api_service_clusters'),
+    path('api/services/<int:pk>/', api.api_service_detail, name='api_service_detail'),
+    path('api/services/<int:pk>/reviews/', api.api_service_reviews, name='api_service_reviews'),
+    path('api/suggest/', api.api_suggest, name='api_suggest'),
 ]
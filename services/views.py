@@ -1,46 +1,54 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import Http404
-import uuid
-from .models import ServiceListing, Category, Review
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from .models import ServiceListing, Category
 from .forms import ServiceListingForm, ReviewForm
+from .cache import get_home_context
+from .geo import NearestResults, parse_point, within_radius
+from .ownership import claim_service, is_service_owner
+from .pagination import KeysetPaginator, paginate, base_querystring
+from .rankings import RANKED_SORTS, ranked_services
+from .review_queue import pending_reviews_for, submit_review
+from .search import search_services
 
 
-def is_service_owner(request, service):
-    """Check if the current session owns this service"""
-    if 'owned_services' not in request.session:
-        return False
-    return str(service.pk) in request.session['owned_services']
+RADIUS_CHOICES_KM = (1, 2, 5, 10, 25, 50)
+REVIEWS_PER_PAGE = 10
+
+# Site-wide totals, summed from the stored per-category counts
+SITE_TOTALS = {
+    'services': Coalesce(Sum('available_count'), 0),
+    'categories': Count('id'),
+}
 
 
 def home(request):
     """Home page showing featured services and categories"""
-    featured_services = ServiceListing.objects.filter(is_available=True).order_by('-created_at')[:6]
-    categories = Category.objects.all()[:8]
+    def build_context():
+        featured_services = ServiceListing.objects.filter(is_available=True).select_related('category').order_by('-created_at')[:6]
+        categories = Category.objects.all()[:8]
+        return {
+            'featured_services': list(featured_services),
+            'categories': list(categories),
+            'totals': Category.objects.aggregate(**SITE_TOTALS),
+        }
     
-    context = {
-        'featured_services': featured_services,
-        'categories': categories,
-    }
+    context = get_home_context(build_context)
     return render(request, 'services/home.html', context)
 
 
-def service_list(request):
-    """List all services with search and filter functionality"""
-    services = ServiceListing.objects.filter(is_available=True)
-    categories = Category.objects.all()
+def filter_services(request):
+    """Apply the search, category, location, radius and sort parameters.
+    
+    Returns the filtered listings and whether they are sorted by distance.
+    """
+    services = ServiceListing.objects.filter(is_available=True).select_related('category')
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        services = services.filter(
-            Q(service_name__icontains=search_query) |
-            Q(provider_name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(location_area__icontains=search_query)
-        )
+        services = search_services(services, search_query)
     
     # Category filter
     category_id = request.GET.get('category')
@@ -52,86 +60,118 @@ def service_list(request):
     if location:
         services = services.filter(location_area__icontains=location)
     
-    # New: Sort by distance if fields exist
-    user_lat = request.GET.get('user_lat')
-    user_lng = request.GET.get('user_lng')
-    sort_method = request.GET.get('sort')
-    if sort_method == 'nearest' and user_lat and user_lng:
-        from math import radians, cos, sin, asin, sqrt
-        user_lat = float(user_lat)
-        user_lng = float(user_lng)
-        def haversine(lat1, lon1, lat2, lon2):
-            # Haversine formula
-            from math import radians
-            R = 6371  # Earth radius in KM
-            dlat = radians(lat2 - lat1)
-            dlon = radians(lon2 - lon1)
-            a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            return R * c
-        def get_distance(s):
-            if s.latitude is not None and s.longitude is not None:
-                return haversine(user_lat, user_lng, s.latitude, s.longitude)
-            return float('inf')
-        # Sorting is in Python for now (since lat/lng fields may be NULL)
-        sorted_services = sorted(services, key=get_distance)
-        services = sorted_services
-    
-    # Pagination
-    paginator = Paginator(services, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # An invalid origin (unparsable, infinite or out of range) is ignored
+    origin = parse_point(request.GET.get('user_lat'), request.GET.get('user_lng'))
+    nearest_sort = request.GET.get('sort') == 'nearest' and origin is not None
+    
+    # Radius filter: distance computed in SQL from the stored sin/cos columns
+    try:
+        radius = float(request.GET.get('radius') or 0)
+    except ValueError:
+        radius = 0
+    if origin and radius > 0:
+        services = within_radius(services, *origin, radius)
+        if nearest_sort:
+            return services.order_by('distance', '-created_at', '-id'), True
+    elif nearest_sort:
+        # Sort by distance: geohash-cell prefilter in SQL, exact distance on candidates
+        return NearestResults(services, *origin), True
+    
+    # Top rated / trending: the order is read from the materialized rankings.
+    # Applied last, as a computed ranking is no longer a plain queryset
+    if request.GET.get('sort') in RANKED_SORTS:
+        services = ranked_services(services, request.GET['sort'], category_id)
+    return services, False
+
+
+def stored_listing_count(request, categories):
+    """Number of matching listings from the stored category counts.
+    
+    Only known when no filter other than the category applies; None otherwise.
+    """
+    if any(request.GET.get(param) for param in ('search', 'location', 'radius')):
+        return None
+    if request.GET.get('sort') in ('nearest', *RANKED_SORTS):
+        return None
+    category_id = request.GET.get('category')
+    if not category_id:
+        return sum(category.available_count for category in categories)
+    for category in categories:
+        if str(category.pk) == category_id:
+            return category.available_count
+    return None
+
+
+def service_list(request):
+    """List all services with search and filter functionality"""
+    services, _ = filter_services(request)
+    categories = list(Category.objects.all())
+    search_query = request.GET.get('search', '')
+    category_id = request.GET.get('category')
+    location = request.GET.get('location')
+    
+    # Pagination (page numbers for the first pages, cursors beyond); the
+    # stored category counts stand in for COUNT(*) where they apply
+    page_obj = paginate(request, services, 12, count=stored_listing_count(request, categories))
     
     context = {
         'page_obj': page_obj,
+        'querystring': base_querystring(request),
         'categories': categories,
         'search_query': search_query,
         'selected_category': category_id,
         'selected_location': location,
-        'user_lat': user_lat if sort_method == 'nearest' and user_lat else '',
-        'user_lng': user_lng if sort_method == 'nearest' and user_lng else '',
+        'fallback_services': ServiceListing.objects.select_related('category')[:6],
+        'user_lat': request.GET.get('user_lat', ''),
+        'user_lng': request.GET.get('user_lng', ''),
+        'radius_choices': RADIUS_CHOICES_KM,
     }
     return render(request, 'services/service_list.html', context)
 
 
 def service_detail(request, pk):
     """Detail view for a specific service"""
-    service = get_object_or_404(ServiceListing, pk=pk)
-    reviews = service.reviews.all()
+    service = get_object_or_404(ServiceListing.objects.select_related('category'), pk=pk)
     
     # Handle review form submission
     if request.method == 'POST':
         form = ReviewForm(request.POST)
         if form.is_valid():
-            review = form.save(commit=False)
-            review.service_listing = service
-            review.save()
+            submit_review(request, service, form)
             messages.success(request, 'Thank you for your review!')
             return redirect('service_detail', pk=pk)
     else:
         form = ReviewForm()
     
+    # One page of reviews; later pages come from service_reviews by cursor
+    cursor = request.GET.get('cursor')
+    reviews = KeysetPaginator(service.reviews.all(), REVIEWS_PER_PAGE).page(cursor)
+    
     context = {
         'service': service,
         'reviews': reviews,
+        'pending_reviews': [] if cursor else pending_reviews_for(request, service),
         'form': form,
         'is_owner': is_service_owner(request, service),
     }
     return render(request, 'services/service_detail.html', context)
 
 
+def service_reviews(request, pk):
+    """HTML fragment with the page of reviews after ``cursor``, for "Load more" """
+    service = get_object_or_404(ServiceListing.objects.only('pk'), pk=pk)
+    reviews = KeysetPaginator(service.reviews.all(), REVIEWS_PER_PAGE).page(request.GET.get('cursor'))
+    return render(request, 'services/review_page.html', {'service': service, 'reviews': reviews})
+
+
 def create_service(request):
     """Create a new service listing"""
     if request.method == 'POST':
         form = ServiceListingForm(request.POST)
         if form.is_valid():
             service = form.save()
-            # Generate a unique owner key and store it in session
-            owner_key = str(uuid.uuid4())
-            if 'owned_services' not in request.session:
-                request.session['owned_services'] = {}
-            request.session['owned_services'][str(service.pk)] = owner_key
-            request.session.save()
+            # Record ownership against this browser's owner key
+            claim_service(request, service)
             
             messages.success(request, 'Your service listing has been created successfully!')
             messages.info(request, f'Your service has been created. You can edit or delete it using your browser session. Keep this page bookmarked to manage your listing.')
@@ -182,11 +222,8 @@ def delete_service(request, pk):
         return redirect('service_detail', pk=pk)
     
     if request.method == 'POST':
+        # The ownership record is removed in cascade
         service.delete()
-        # Remove from session
-        if 'owned_services' in request.session:
-            request.session['owned_services'].pop(str(service.pk), None)
-            request.session.save()
         messages.success(request, 'Your service listing has been deleted successfully!')
         return redirect('service_list')
     
@@ -199,25 +236,27 @@ def delete_service(request, pk):
 def category_services(request, category_id):
     """Show services for a specific category"""
     category = get_object_or_404(Category, pk=category_id)
-    services = ServiceListing.objects.filter(category=category, is_available=True)
+    services = ServiceListing.objects.filter(category=category, is_available=True).select_related('category')
     
     # Search within category
     search_query = request.GET.get('search', '')
     if search_query:
-        services = services.filter(
-            Q(service_name__icontains=search_query) |
-            Q(provider_name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        services = search_services(services, search_query,
+                                   fields=('service_name', 'provider_name', 'description'))
+    
+    sort = request.GET.get('sort')
+    if sort in RANKED_SORTS:
+        services = ranked_services(services, sort, category.pk)
     
-    # Pagination
-    paginator = Paginator(services, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (page numbers for the first pages, cursors beyond)
+    stored_count = None if search_query or sort in RANKED_SORTS else category.available_count
+    page_obj = paginate(request, services, 12, count=stored_count)
     
     context = {
         'category': category,
         'page_obj': page_obj,
+        'querystring': base_querystring(request),
         'search_query': search_query,
+        'sort': sort,
     }
     return render(request, 'services/category_services.html', context)